@@ -0,0 +1,115 @@
+"""
+SSE(JSON) 경로와 WebSocket(MessagePack + deflate) 경로의 인코딩 비용/전송량 비교
+
+실제 네트워크 없이 서버가 클라이언트마다 수행하는 직렬화·압축 작업과
+전송 바이트만 측정한다. 연결 처리를 포함한 서버 CPU는 load_test.py --transport sse|ws로 측정한다.
+
+$ python bench_encoding.py --clients 1000 --updates 300
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+from room_hub import Message
+from ws_transport import encode_room
+
+SSE_POLL_INTERVAL = 0.4
+
+
+def make_states(updates: int, seed=0):
+    """펀치가 0.4초마다 한 번씩 발생하는 경기 상태 시퀀스"""
+    rng = random.Random(seed)
+    state = {
+        player_id: {
+            'position': position,
+            'punches': {'hook': 0},
+            'hits': {'face': 0, 'body': 0},
+            'last_punch_time': 0,
+            'tracking_id': None,
+            'last_position': None
+        }
+        for player_id, position in (('player1', 'left'), ('player2', 'right'))
+    }
+    states = []
+    now = time.time()
+    for i in range(updates):
+        player = state[rng.choice(['player1', 'player2'])]
+        player['punches']['hook'] += 1
+        player['last_punch_time'] = now + i * SSE_POLL_INTERVAL
+        player['last_position'] = round(rng.uniform(100, 500), 1)
+        if rng.random() < 0.4:
+            player['hits'][rng.choice(['face', 'body'])] += 1
+        states.append(json.loads(json.dumps(state)))
+    return states
+
+
+def bench_sse_per_client(states, clients):
+    """기존 /api/stream/{room}: 클라이언트마다 폴링하고 JSON 직렬화"""
+    sent = 0
+    start = time.process_time()
+    for state in states:
+        for _ in range(clients):
+            sent += len(f"data: {json.dumps(state)}\n\n".encode('utf-8'))
+    return sent, time.process_time() - start
+
+
+def bench_sse_shared(states, clients):
+    """/api/stream: 메시지당 한 번만 직렬화해 공유"""
+    sent = 0
+    start = time.process_time()
+    for state in states:
+        frame = f"data: {Message({'type': 'room', 'room': 'ring1', 'state': state}).json()}\n\n".encode('utf-8')
+        sent += len(frame) * clients
+    return sent, time.process_time() - start
+
+
+def bench_websocket(states, clients, fields, deflate=True):
+    """/api/ws: 필드 구독 + 변경분 + MessagePack + permessage-deflate(컨텍스트 유지)"""
+    fields_key = tuple(sorted(fields)) if fields else None
+    compressors = [zlib.compressobj(wbits=-zlib.MAX_WBITS) for _ in range(clients)]
+    previous = [None] * clients
+    sent = 0
+    start = time.process_time()
+    for state in states:
+        message = Message({'type': 'room', 'room': 'ring1', 'state': state})
+        for i in range(clients):
+            frame = encode_room(message, fields_key, previous[i])
+            previous[i] = message
+            if frame is None:
+                continue
+            if not deflate:
+                sent += len(frame)
+                continue
+            compressed = compressors[i].compress(frame) + compressors[i].flush(zlib.Z_SYNC_FLUSH)
+            sent += len(compressed) - 4  # 메시지 끝의 00 00 ff ff 는 전송하지 않음
+    return sent, time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--updates', type=int, default=300)
+    parser.add_argument('--fields', default='player1.hits,player2.hits,player1.punches,player2.punches')
+    args = parser.parse_args()
+
+    states = make_states(args.updates)
+    duration = args.updates * SSE_POLL_INTERVAL
+    fields = [field for field in args.fields.split(',') if field] or None
+
+    results = [
+        ('SSE per-client JSON', *bench_sse_per_client(states, args.clients)),
+        ('SSE shared JSON', *bench_sse_shared(states, args.clients)),
+        ('WS msgpack', *bench_websocket(states, args.clients, fields, deflate=False)),
+        ('WS msgpack+deflate', *bench_websocket(states, args.clients, fields)),
+    ]
+
+    print(f"{args.clients} clients, {args.updates} updates over {duration:.0f}s of play")
+    print(f"{'transport':<22}{'KB/s total':>12}{'B/s/client':>12}{'CPU ms/s':>10}")
+    for name, sent, cpu in results:
+        print(f"{name:<22}{sent / duration / 1024:>12.1f}{sent / duration / args.clients:>12.1f}"
+              f"{cpu / duration * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import asyncio
+import time
+import cv2
+import numpy as np
+from typing import Dict, Optional
+
+# 시간 구간(초)마다 분석 카메라를 다시 선택
+SLICE_SECONDS = 1.0
+# 비활성 카메라를 YOLO로 다시 평가하는 간격
+PROBE_INTERVAL = 3.0
+# 현재 카메라보다 이만큼 높아야 전환 (잦은 전환 방지)
+SWITCH_MARGIN = 0.15
+# 이 시간 동안 프레임이 없으면 끊긴 카메라로 간주
+STALE_SECONDS = 2.0
+# 움직임 지표 정규화 기준 (저해상도 밝기 차이 평균)
+MOTION_REFERENCE = 8.0
+
+
+class CameraFeed:
+    """카메라(비디오 트랙) 한 개의 품질 지표"""
+
+    def __init__(self, track_sid: str, participant: str = None, alpha=0.3):
+        self.track_sid = track_sid
+        self.participant = participant
+        self.alpha = alpha
+
+        self.visibility = 0.0   # 선수 2명 감지 정도 (YOLO, 활성 카메라는 분석 결과, 나머지는 주기적 평가)
+        self.pose = 0.0         # 포즈 랜드마크 가시성 (활성 카메라만 측정하므로 비교에는 사용하지 않음)
+        self.motion = 0.0
+        self.last_frame_time = 0.0
+        self.last_probe_time = 0.0
+        self.prev_small = None
+
+    def gate(self, y_plane: np.ndarray, now: float):
+        """밝기(Y) 평면만으로 계산하는 저비용 움직임 지표"""
+        small = cv2.resize(y_plane, (64, 48), interpolation=cv2.INTER_AREA)
+        if self.prev_small is not None:
+            motion = float(cv2.absdiff(small, self.prev_small).mean())
+            self.motion += self.alpha * (motion - self.motion)
+        self.prev_small = small
+        self.last_frame_time = now
+
+    def update_visibility(self, persons: int, person_conf: float):
+        visibility = min(persons, 2) / 2 * person_conf
+        self.visibility += self.alpha * (visibility - self.visibility)
+
+    def update_pose(self, pose_visibility: float):
+        self.pose += self.alpha * (pose_visibility - self.pose)
+
+    def score(self, now: float) -> float:
+        """모든 카메라에서 측정하는 지표(선수 가시성, 움직임)만으로 계산한 비교 점수"""
+        if now - self.last_frame_time > STALE_SECONDS:
+            return 0.0
+        return 0.85 * self.visibility + 0.15 * min(self.motion / MOTION_REFERENCE, 1.0)
+
+    def summary(self, now: float) -> Dict:
+        return {
+            'participant': self.participant,
+            'score': round(self.score(now), 3),
+            'visibility': round(self.visibility, 3),
+            'pose': round(self.pose, 3),
+            'motion': round(self.motion, 2)
+        }
+
+
+class CameraArbiter:
+    """
+    방의 여러 카메라 중 시간 구간마다 가장 좋은 시점 하나만 전체 분석(YOLO+포즈)에 사용
+    나머지 카메라는 움직임 게이팅과 주기적인 YOLO 평가만 수행한다.
+    """
+
+    def __init__(self, detector, slice_seconds=SLICE_SECONDS, probe_interval=PROBE_INTERVAL,
+                 switch_margin=SWITCH_MARGIN):
+        self.detector = detector
+        self.slice_seconds = slice_seconds
+        self.probe_interval = probe_interval
+        self.switch_margin = switch_margin
+
+        self.feeds = {}
+        self.active = None
+        self.last_select_time = 0.0
+        self.switches = 0
+
+    def add_feed(self, track_sid: str, participant: str = None):
+        self.feeds[track_sid] = CameraFeed(track_sid, participant)
+        if self.active is None:
+            self.active = track_sid
+
+    def remove_feed(self, track_sid: str):
+        self.feeds.pop(track_sid, None)
+        if self.active == track_sid:
+            self.active = None
+            self.select(force=True)
+
+    def is_active(self, track_sid: str) -> bool:
+        return self.active == track_sid
+
+    def gate(self, track_sid: str, y_plane: np.ndarray):
+        """모든 카메라 프레임에 대해 호출 (저비용)"""
+        feed = self.feeds.get(track_sid)
+        if feed is None:
+            return
+        now = time.time()
+        feed.gate(y_plane, now)
+        if now - self.last_select_time >= self.slice_seconds:
+            self.select()
+
+    def wants_probe(self, track_sid: str) -> bool:
+        feed = self.feeds.get(track_sid)
+        return (feed is not None and not self.is_active(track_sid)
+                and time.time() - feed.last_probe_time >= self.probe_interval)
+
+    async def probe(self, track_sid: str, frame: np.ndarray):
+        """비활성 카메라 프레임의 선수 가시성을 YOLO로만 평가"""
+        feed = self.feeds.get(track_sid)
+        if feed is None:
+            return
+        feed.last_probe_time = time.time()
+        try:
+            frame = cv2.resize(frame, (640, 480))
+            person_boxes = await asyncio.get_event_loop().run_in_executor(
+                None, self.detector.detect_persons, frame
+            )
+            top_confs = sorted((box['conf'] for box in person_boxes), reverse=True)[:2]
+            feed.update_visibility(len(person_boxes), sum(top_confs) / 2)
+        except Exception as e:
+            print(f"Error while probing camera {track_sid}: {e}")
+
+    def report(self, quality: Optional[Dict], track_sid: Optional[str] = None):
+        """
+        전체 분석 결과로 카메라 품질 갱신 (프레임마다 한 번)
+        track_sid는 분석한 프레임의 카메라 (없으면 현재 활성 카메라)
+        """
+        feed = self.feeds.get(track_sid if track_sid is not None else self.active)
+        if feed is None or not quality:
+            return
+        feed.update_visibility(quality['persons'], quality['person_conf'])
+        feed.update_pose(quality['pose_visibility'])
+
+    def select(self, force=False):
+        """가장 점수가 높은 카메라 선택"""
+        now = time.time()
+        self.last_select_time = now
+        if not self.feeds:
+            return
+
+        best = max(self.feeds.values(), key=lambda feed: feed.score(now))
+        current = self.feeds.get(self.active)
+        if current is not None and not force:
+            if best is current or best.score(now) < current.score(now) + self.switch_margin:
+                return
+
+        if best.track_sid != self.active:
+            if current is not None:
+                # 비활성 카메라의 포즈 지표는 더 갱신되지 않으므로 초기화
+                current.pose = 0.0
+            self.active = best.track_sid
+            self.switches += 1
+            # 다른 시점의 손목 좌표와 섞이지 않도록 초기화
+            self.detector.reset_motion_state()
+
+    def summary(self) -> Dict:
+        now = time.time()
+        return {
+            'active': self.active,
+            'switches': self.switches,
+            'feeds': {sid: feed.summary(now) for sid, feed in self.feeds.items()}
+        }
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+
+MAGIC = b'FCCP'
+VERSION = 2
+HEADER_FORMAT = '<4sHd'
+# 레코드 헤더: 종류, 프레임 번호, 촬영 시각, 페이로드 길이
+RECORD_FORMAT = '<BIdI'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+FRAME_FORMAT = '<II'    # width, height
+
+RECORD_FRAME = 1        # zlib 압축한 원본 I420 프레임
+RECORD_TIMINGS = 2      # 단계별 처리 시간 (JSON)
+RECORD_STATE = 3        # 캡처 시작 시점의 감지기 상태 (JSON, PunchDetector.capture_state)
+
+
+def capture_path(room_name: str, started_at: float) -> str:
+    filename = f"{room_name}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(started_at))}.fccap"
+    return os.path.join(CAPTURE_DIR, filename)
+
+
+class CaptureWriter:
+    """
+    방 입력(원본 I420 프레임 + 촬영 시각)과 단계별 처리 시간을 파일로 기록
+    파일 열기, 압축, 쓰기, 닫기는 모두 별도 스레드에서 수행하고(이벤트 루프를 막지 않음), 밀리면 레코드를 버린다.
+    """
+
+    def __init__(self, room_name: str, path: Optional[str] = None, max_pending=64,
+                 initial_state: Optional[Dict] = None):
+        self.room_name = room_name
+        self.started_at = time.time()
+        self.path = path or capture_path(room_name, self.started_at)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.initial_state = initial_state
+        self.stopping = threading.Event()
+        self.next_seq = 0
+        self.frames = 0
+        self.dropped = 0
+
+        self.thread = threading.Thread(target=self._run, name=f"capture-{room_name}", daemon=True)
+        self.thread.start()
+
+    def write_frame(self, timestamp: float, width: int, height: int, data) -> Optional[int]:
+        """원본 프레임 기록 요청, 프레임 번호 반환 (버린 경우 None)"""
+        if self.stopping.is_set():
+            return None
+        seq = self.next_seq
+        try:
+            self.queue.put_nowait((RECORD_FRAME, seq, timestamp, (width, height, bytes(data))))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        self.next_seq += 1
+        return seq
+
+    def write_timings(self, seq: int, timestamp: float, timings: Dict):
+        if self.stopping.is_set():
+            return
+        try:
+            self.queue.put_nowait((RECORD_TIMINGS, seq, timestamp, timings))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_record(self, file, kind, seq, timestamp, payload):
+        if kind == RECORD_FRAME:
+            width, height, data = payload
+            payload = struct.pack(FRAME_FORMAT, width, height) + zlib.compress(data, 1)
+            self.frames += 1
+        else:
+            payload = json.dumps(payload).encode('utf-8')
+        file.write(struct.pack(RECORD_FORMAT, kind, seq, timestamp, len(payload)))
+        file.write(payload)
+
+    def _run(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'wb') as file:
+                file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.started_at))
+                if self.initial_state is not None:
+                    self._write_record(file, RECORD_STATE, 0, self.started_at, self.initial_state)
+                # 종료 요청 후에도 큐에 남은 레코드는 모두 기록
+                while not (self.stopping.is_set() and self.queue.empty()):
+                    try:
+                        item = self.queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    self._write_record(file, *item)
+            print(f"캡처 저장: {self.path} ({self.frames} frames, {self.dropped} dropped)")
+        except Exception as e:
+            print(f"Error in capture writer: {e}")
+            self.stopping.set()
+
+    def close(self):
+        """기록 종료 요청 (대기하지 않음, 남은 레코드는 스레드가 기록 후 파일을 닫음)"""
+        self.stopping.set()
+
+    async def wait_closed(self):
+        """남은 레코드 기록이 끝날 때까지 이벤트 루프를 막지 않고 대기"""
+        await asyncio.get_event_loop().run_in_executor(None, self.thread.join)
+
+
+class CaptureReader:
+    """캡처 파일 읽기"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, started_at = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC:
+            raise ValueError(f"캡처 파일 형식이 아닙니다: {path}")
+        self.version = version
+        self.started_at = started_at
+
+    def records(self, decode_frames=True) -> Iterator[Tuple[int, int, float, object]]:
+        """(종류, 프레임 번호, 촬영 시각, 페이로드) 순회 (잘린 마지막 레코드는 무시)"""
+        with open(self.path, 'rb') as f:
+            f.seek(struct.calcsize(HEADER_FORMAT))
+            while True:
+                header = f.read(RECORD_SIZE)
+                if len(header) < RECORD_SIZE:
+                    return
+                kind, seq, timestamp, length = struct.unpack(RECORD_FORMAT, header)
+                if kind == RECORD_FRAME and not decode_frames:
+                    f.seek(length, os.SEEK_CUR)
+                    continue
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+                if kind == RECORD_FRAME:
+                    width, height = struct.unpack_from(FRAME_FORMAT, payload)
+                    data = zlib.decompress(payload[struct.calcsize(FRAME_FORMAT):])
+                    yield kind, seq, timestamp, (width, height, data)
+                elif kind in (RECORD_TIMINGS, RECORD_STATE):
+                    yield kind, seq, timestamp, json.loads(payload)
+
+    def frames(self):
+        for kind, seq, timestamp, payload in self.records():
+            if kind == RECORD_FRAME:
+                yield seq, timestamp, payload
+
+    def initial_state(self) -> Optional[Dict]:
+        """캡처 시작 시점의 감지기 상태 (이전 버전 파일이면 None)"""
+        for kind, _, _, payload in self.records(decode_frames=False):
+            if kind == RECORD_STATE:
+                return payload
+            if kind == RECORD_TIMINGS:
+                return None
+        return None
+
+    def timings(self) -> Dict[int, Dict]:
+        return {seq: payload for kind, seq, _, payload in self.records(decode_frames=False)
+                if kind == RECORD_TIMINGS}
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+CLIP_DIR = os.getenv("CLIP_DIR", "clips")
+CLIP_ROOM_MEMORY_MB = float(os.getenv("CLIP_ROOM_MEMORY_MB", 32))
+CLIP_TOTAL_MEMORY_MB = float(os.getenv("CLIP_TOTAL_MEMORY_MB", 256))
+CLIP_PRE_SECONDS = float(os.getenv("CLIP_PRE_SECONDS", 3))
+CLIP_POST_SECONDS = float(os.getenv("CLIP_POST_SECONDS", 2))
+
+# 모든 방이 공유하는 JPEG 인코딩 워커
+encoder_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-encoder")
+
+
+class MemoryBudget:
+    """모든 방 프레임 버퍼의 전체 메모리 상한"""
+
+    def __init__(self, cap_bytes: int):
+        self.cap_bytes = cap_bytes
+        self.used = 0
+        self.buffers = set()
+        self.lock = threading.Lock()
+
+    def register(self, buffer):
+        with self.lock:
+            self.buffers.add(buffer)
+
+    def unregister(self, buffer):
+        """버퍼 해제 (이 예산에 반영된 만큼만 차감)"""
+        with self.lock:
+            if buffer in self.buffers:
+                self.buffers.discard(buffer)
+                self.used -= buffer.budgeted
+                buffer.budgeted = 0
+
+    def add(self, buffer, nbytes: int):
+        """사용량 반영 후, 상한을 넘으면 가장 많이 쓰는 방부터 오래된 프레임 제거"""
+        with self.lock:
+            # 해제된 버퍼에서 늦게 끝난 인코딩은 반영하지 않음
+            if buffer not in self.buffers:
+                return
+            self.used += nbytes
+            buffer.budgeted += nbytes
+            while self.used > self.cap_bytes and self.buffers:
+                largest = max(self.buffers, key=lambda b: b.nbytes)
+                freed = largest.evict_oldest()
+                if freed == 0:
+                    break
+                self.used -= freed
+                largest.budgeted -= freed
+
+
+global_budget = MemoryBudget(int(CLIP_TOTAL_MEMORY_MB * 1024 * 1024))
+
+
+class FrameRingBuffer:
+    """최근 프레임을 축소 JPEG로 보관하는 방별 링 버퍼 (메모리 상한 기준)"""
+
+    def __init__(self, room_name: str, memory_cap_mb: float = CLIP_ROOM_MEMORY_MB,
+                 budget: MemoryBudget = global_budget, scale=0.5, quality=70, max_pending=2):
+        self.room_name = room_name
+        self.cap_bytes = int(memory_cap_mb * 1024 * 1024)
+        self.budget = budget
+        self.scale = scale
+        self.quality = quality
+        self.max_pending = max_pending
+
+        self.frames = deque()   # (timestamp, jpeg bytes)
+        self.nbytes = 0
+        self.budgeted = 0       # 전체 예산에 반영된 바이트 (MemoryBudget 잠금으로 보호)
+        self.closed = False
+        self.pending = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        budget.register(self)
+
+    def push(self, frame: np.ndarray, timestamp: Optional[float] = None):
+        """프레임을 백그라운드 인코더에 넘김 (인코더가 밀리면 프레임을 건너뜀)"""
+        with self.lock:
+            if self.closed:
+                return
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending += 1
+        encoder_pool.submit(self._encode, frame, timestamp or time.time())
+
+    def _encode(self, frame: np.ndarray, timestamp: float):
+        try:
+            if self.scale != 1.0:
+                frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                return
+            data = encoded.tobytes()
+            freed = 0
+            with self.lock:
+                # 닫힌 뒤 큐에 남아 있던 프레임은 버림
+                if self.closed:
+                    return
+                self.frames.append((timestamp, data))
+                self.nbytes += len(data)
+                while self.nbytes > self.cap_bytes and len(self.frames) > 1:
+                    _, old = self.frames.popleft()
+                    self.nbytes -= len(old)
+                    freed += len(old)
+            self.budget.add(self, len(data) - freed)
+        except Exception as e:
+            print(f"Error in frame encoder: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def evict_oldest(self) -> int:
+        """가장 오래된 프레임 제거 (전체 상한 초과 시 MemoryBudget에서 호출)"""
+        with self.lock:
+            if not self.frames:
+                return 0
+            _, old = self.frames.popleft()
+            self.nbytes -= len(old)
+            return len(old)
+
+    def frames_between(self, start: float, end: float) -> List:
+        with self.lock:
+            return [(t, data) for t, data in self.frames if start <= t <= end]
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.budget.unregister(self)
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+
+def write_clip(path: str, frames: List, fps: float):
+    """JPEG 프레임 목록을 mp4 파일로 기록"""
+    first = cv2.imdecode(np.frombuffer(frames[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+    height, width = first.shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    try:
+        for _, data in frames:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height))
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+class ClipWriter:
+    """타격/콤보 이벤트 전후 구간을 비동기로 클립 파일로 저장"""
+
+    def __init__(self, buffer: FrameRingBuffer, clip_dir: str = CLIP_DIR,
+                 pre_seconds: float = CLIP_PRE_SECONDS, post_seconds: float = CLIP_POST_SECONDS):
+        self.buffer = buffer
+        self.clip_dir = clip_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.current = None   # 기록 대기 중인 클립 {'start', 'end', 'events'}
+        self.tasks = set()
+
+    def start(self):
+        os.makedirs(self.clip_dir, exist_ok=True)
+
+    def __call__(self, event: Dict):
+        if not (event.get('target') or event.get('kind') == 'combo'):
+            return
+        timestamp = event.get('timestamp', time.time())
+
+        # 대기 중인 클립 구간에 들어오면 구간만 연장
+        if self.current and timestamp <= self.current['end']:
+            self.current['end'] = timestamp + self.post_seconds
+            self.current['events'].append(event)
+            return
+
+        self.current = {
+            'start': timestamp - self.pre_seconds,
+            'end': timestamp + self.post_seconds,
+            'events': [event]
+        }
+        task = asyncio.ensure_future(self._save(self.current))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _save(self, clip):
+        try:
+            # 이벤트 이후 구간이 버퍼에 쌓일 때까지 대기
+            while time.time() < clip['end']:
+                await asyncio.sleep(clip['end'] - time.time())
+            if self.current is clip:
+                self.current = None
+
+            frames = self.buffer.frames_between(clip['start'], clip['end'])
+            if len(frames) < 2:
+                return
+            fps = (len(frames) - 1) / max(frames[-1][0] - frames[0][0], 1e-3)
+            event = clip['events'][0]
+            name = (f"{self.buffer.room_name}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(event['timestamp']))}"
+                    f"_{event.get('player')}_{event.get('target') or event.get('kind')}.mp4")
+            path = os.path.join(self.clip_dir, name)
+            # 프레임 인코더가 밀리지 않도록 클립 기록은 별도 스레드에서 수행
+            await asyncio.get_event_loop().run_in_executor(None, write_clip, path, frames, fps)
+            print(f"클립 저장: {path} ({len(frames)} frames)")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error while saving clip: {e}")
+
+    async def close(self):
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.buffer.close()
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import struct
+import time
+import numpy as np
+from typing import Dict, Optional
+
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "event_logs")
+
+# 파일 헤더: magic, 버전, 레코드 크기, 세션 시작 시각
+HEADER_FORMAT = '<4sHHd'
+HEADER_SIZE = 64
+MAGIC = b'FCEV'
+VERSION = 1
+
+# 이벤트 한 건 (고정 길이 레코드)
+EVENT_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('room', 'S32'),
+    ('player', 'u1'),
+    ('kind', 'u1'),
+    ('punch', 'u1'),
+    ('target', 'u1'),
+    ('round', '<u2'),
+    ('distance', '<f4'),
+    ('confidence', '<f4'),
+])
+
+EVENT_KINDS = ['punch', 'combo']
+PUNCH_TYPES = ['none', 'hook', 'cross', 'jab', 'uppercut']
+TARGETS = ['none', 'face', 'body']
+PLAYERS = ['player1', 'player2']
+
+
+def encode_player(player_id: str) -> int:
+    return PLAYERS.index(player_id) if player_id in PLAYERS else 255
+
+
+def session_path(room_name: str, started_at: float) -> str:
+    filename = f"{room_name}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(started_at))}.evlog"
+    return os.path.join(EVENT_LOG_DIR, filename)
+
+
+class EventLogWriter:
+    """세션별 append-only 이벤트 로그
+
+    이벤트는 메모리 버퍼에 모았다가 백그라운드 스레드에서 기록하고,
+    fsync는 fsync_interval 간격으로만 수행한다.
+    """
+
+    def __init__(self, room_name: str, path: Optional[str] = None,
+                 buffer_size=256, flush_interval=1.0, fsync_interval=5.0):
+        self.room_name = room_name
+        self.room_bytes = room_name.encode('utf-8')[:32]
+        self.started_at = time.time()
+        self.path = path or session_path(room_name, self.started_at)
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+
+        self.buffer = np.zeros(buffer_size, dtype=EVENT_DTYPE)
+        self.count = 0
+        self.lock = asyncio.Lock()
+        self.task = None
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.file = open(self.path, 'ab')
+        if self.file.tell() == 0:
+            header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, EVENT_DTYPE.itemsize, self.started_at)
+            self.file.write(header.ljust(HEADER_SIZE, b'\0'))
+        self.last_fsync = time.time()
+
+    def start(self):
+        """주기적 flush 태스크 시작"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._flush_loop())
+        return self.task
+
+    def append(self, event: Dict):
+        """
+        이벤트 추가 (이벤트 루프에서 호출, 블로킹 없음)
+        round는 감지기(PunchDetector.round)가 이벤트에 넣은 값, confidence는 펀치/타격 판정 신뢰도
+        """
+        if self.count == len(self.buffer):
+            # 버퍼가 가득 차면 용량을 늘리고 다음 flush에서 비움
+            self.buffer = np.resize(self.buffer, len(self.buffer) * 2)
+        record = self.buffer[self.count]
+        record['timestamp'] = event.get('timestamp', time.time())
+        record['room'] = self.room_bytes
+        record['player'] = encode_player(event.get('player'))
+        record['kind'] = EVENT_KINDS.index(event.get('kind', 'punch'))
+        record['punch'] = PUNCH_TYPES.index(event.get('punch') or 'none')
+        record['target'] = TARGETS.index(event.get('target') or 'none')
+        record['round'] = event['round']
+        record['distance'] = event.get('distance', np.nan)
+        record['confidence'] = event.get('confidence', np.nan)
+        self.count += 1
+
+    def __call__(self, event: Dict):
+        self.append(event)
+
+    def _write(self, data: bytes, sync: bool):
+        self.file.write(data)
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    async def flush(self, sync=False):
+        """버퍼 내용을 파일에 기록"""
+        async with self.lock:
+            if self.count == 0 and not sync:
+                return
+            data = self.buffer[:self.count].tobytes()
+            self.count = 0
+            sync = sync or time.time() - self.last_fsync >= self.fsync_interval
+            await asyncio.get_event_loop().run_in_executor(None, self._write, data, sync)
+            if sync:
+                self.last_fsync = time.time()
+
+    async def _flush_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self):
+        """남은 이벤트 기록 후 파일 닫기"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush(sync=True)
+        self.file.close()
+
+
+class EventLogReader:
+    """memory-map으로 이벤트 로그를 읽고 집계"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, itemsize, started_at = struct.unpack(
+                HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC or itemsize != EVENT_DTYPE.itemsize:
+            raise ValueError(f"지원하지 않는 이벤트 로그 형식: {path}")
+        self.version = version
+        self.started_at = started_at
+
+        # 기록 중인 마지막 레코드는 제외
+        count = (os.path.getsize(path) - HEADER_SIZE) // EVENT_DTYPE.itemsize
+        if count > 0:
+            self.events = np.memmap(path, dtype=EVENT_DTYPE, mode='r',
+                                    offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.events = np.zeros(0, dtype=EVENT_DTYPE)
+
+    def __len__(self):
+        return len(self.events)
+
+    def _select(self, kind='punch', start=None, end=None):
+        events = self.events
+        mask = events['kind'] == EVENT_KINDS.index(kind)
+        if start is not None:
+            mask &= events['timestamp'] >= start
+        if end is not None:
+            mask &= events['timestamp'] < end
+        return events[mask]
+
+    def player_totals(self, start=None, end=None) -> Dict:
+        """선수별 펀치/타격 합계"""
+        events = self._select('punch', start, end)
+        players = events['player'].astype(np.intp)
+        valid = players < len(PLAYERS)
+        players = players[valid]
+        targets = events['target'][valid].astype(np.intp)
+
+        punches = np.bincount(players, minlength=len(PLAYERS))
+        hits = np.bincount(players * len(TARGETS) + targets,
+                           minlength=len(PLAYERS) * len(TARGETS)).reshape(len(PLAYERS), len(TARGETS))
+        return {
+            player_id: {
+                'punches': int(punches[i]),
+                'hits': {target: int(hits[i, t]) for t, target in enumerate(TARGETS) if target != 'none'}
+            }
+            for i, player_id in enumerate(PLAYERS)
+        }
+
+    def round_totals(self) -> Dict:
+        """라운드·선수별 펀치/타격 수"""
+        events = self._select('punch')
+        valid = events['player'] < len(PLAYERS)
+        events = events[valid]
+        if len(events) == 0:
+            return {}
+
+        rounds = events['round'].astype(np.intp)
+        players = events['player'].astype(np.intp)
+        is_hit = events['target'] != TARGETS.index('none')
+        n_rounds = int(rounds.max()) + 1
+        keys = rounds * len(PLAYERS) + players
+        punches = np.bincount(keys, minlength=n_rounds * len(PLAYERS)).reshape(n_rounds, len(PLAYERS))
+        hits = np.bincount(keys, weights=is_hit, minlength=n_rounds * len(PLAYERS)).reshape(n_rounds, len(PLAYERS))
+
+        result = {}
+        for r in np.unique(rounds):
+            result[int(r)] = {
+                player_id: {'punches': int(punches[r, i]), 'hits': int(hits[r, i])}
+                for i, player_id in enumerate(PLAYERS)
+            }
+        return result
@@ -0,0 +1,130 @@
+import numpy as np
+from typing import Dict, Optional
+
+NUM_LANDMARKS = 33
+
+# 프레임 한 개 분량의 선수 기록 (고정 크기 레코드)
+HISTORY_DTYPE = np.dtype([
+    ('timestamp', np.float64),
+    ('bbox', np.float32, (4,)),
+    ('center', np.float32, (2,)),
+    ('confidence', np.float32),
+    ('landmarks', np.float32, (NUM_LANDMARKS, 3)),
+])
+
+
+def landmarks_to_array(landmarks, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """MediaPipe 랜드마크 리스트를 (33, 3) float32 배열로 변환"""
+    if out is None:
+        out = np.zeros((NUM_LANDMARKS, 3), dtype=np.float32)
+    if landmarks is None:
+        out[:] = np.nan
+        return out
+    if isinstance(landmarks, np.ndarray):
+        out[:] = landmarks[:NUM_LANDMARKS, :3]
+        return out
+    for i, lm in enumerate(landmarks):
+        if i >= NUM_LANDMARKS:
+            break
+        out[i, 0] = lm.x
+        out[i, 1] = lm.y
+        out[i, 2] = lm.z
+    return out
+
+
+class PlayerHistory:
+    """고정 용량 NumPy 링 버퍼 기반 선수 기록
+
+    append는 O(1)이며 평균 신뢰도와 이동 범위는 추가/삭제 시점에 갱신되므로
+    통계 조회 시 새로운 리스트를 만들지 않는다.
+    """
+
+    def __init__(self, capacity: int = 30):
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=HISTORY_DTYPE)
+        self.head = 0   # 다음에 쓸 위치
+        self.size = 0
+
+        # 증분 통계
+        self.confidence_sum = 0.0
+        self.center_min = np.full(2, np.inf, dtype=np.float32)
+        self.center_max = np.full(2, -np.inf, dtype=np.float32)
+        self.range_dirty = False
+
+    def __len__(self):
+        return self.size
+
+    def append(self, bbox, center, confidence: float, landmarks=None, timestamp: float = 0.0):
+        """새 프레임 기록 추가 (가장 오래된 기록은 덮어씀)"""
+        slot = self.records[self.head]
+
+        if self.size == self.capacity:
+            # 밀려나는 기록을 통계에서 제거
+            self.confidence_sum -= float(slot['confidence'])
+            old_center = slot['center']
+            if np.any(old_center <= self.center_min) or np.any(old_center >= self.center_max):
+                self.range_dirty = True
+        else:
+            self.size += 1
+
+        slot['timestamp'] = timestamp
+        slot['bbox'] = bbox
+        slot['center'] = center
+        slot['confidence'] = confidence
+        landmarks_to_array(landmarks, out=slot['landmarks'])
+
+        # 제거할 때와 같은 값(float32로 저장된 값)을 더해 오차 누적 방지
+        self.confidence_sum += float(slot['confidence'])
+        if not self.range_dirty:
+            np.minimum(self.center_min, slot['center'], out=self.center_min)
+            np.maximum(self.center_max, slot['center'], out=self.center_max)
+
+        self.head = (self.head + 1) % self.capacity
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+        self.confidence_sum = 0.0
+        self.center_min.fill(np.inf)
+        self.center_max.fill(-np.inf)
+        self.range_dirty = False
+
+    def _refresh_range(self):
+        """삭제된 기록이 극값이었을 때만 벡터 연산으로 범위를 다시 계산"""
+        centers = self.records['center'][:self.size]
+        centers.min(axis=0, out=self.center_min)
+        centers.max(axis=0, out=self.center_max)
+        self.range_dirty = False
+
+    def latest(self) -> Optional[np.void]:
+        """가장 최근 기록"""
+        if self.size == 0:
+            return None
+        return self.records[(self.head - 1) % self.capacity]
+
+    def latest_landmarks(self) -> Optional[np.ndarray]:
+        record = self.latest()
+        return None if record is None else record['landmarks']
+
+    def ordered(self) -> np.ndarray:
+        """오래된 순서로 정렬된 기록 (복사본)"""
+        if self.size < self.capacity:
+            return self.records[:self.size].copy()
+        return np.roll(self.records, -self.head)
+
+    def movement_range(self) -> Dict:
+        if self.range_dirty:
+            self._refresh_range()
+        return {
+            'x': (float(self.center_min[0]), float(self.center_max[0])),
+            'y': (float(self.center_min[1]), float(self.center_max[1]))
+        }
+
+    def avg_confidence(self) -> float:
+        if self.size == 0:
+            return 0.0
+        return self.confidence_sum / self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes
@@ -0,0 +1,164 @@
+import numpy as np
+from typing import Dict, List, Optional
+
+# MediaPipe Pose 랜드마크 번호
+NOSE = 0
+LEFT_EAR, RIGHT_EAR = 7, 8
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+
+# 타격 부위 크기 (선수 몸통 길이 = 1 기준)
+HEAD_RADIUS = 0.35
+TORSO_RADIUS = 0.45
+GLOVE_RADIUS = 0.12
+# 이 가시성보다 낮은 랜드마크로 만든 부위/손목은 판정에서 제외
+MIN_VISIBILITY = 0.3
+# 이 신뢰도 이상일 때만 타격으로 인정
+MIN_HIT_CONFIDENCE = 0.35
+
+TARGETS = ('face', 'body')
+
+
+def pose_to_array(pose_landmarks, offset=(0, 0), size=(1, 1)) -> Optional[np.ndarray]:
+    """
+    선수 크롭에서 얻은 MediaPipe 랜드마크를 프레임 픽셀 좌표 (33, 3) 배열로 변환
+    열은 x, y, visibility
+    """
+    if pose_landmarks is None:
+        return None
+    landmarks = pose_landmarks.landmark
+    pose = np.empty((len(landmarks), 3), dtype=np.float32)
+    for i, lm in enumerate(landmarks):
+        pose[i] = (lm.x, lm.y, lm.visibility)
+    pose[:, 0] = pose[:, 0] * size[0] + offset[0]
+    pose[:, 1] = pose[:, 1] * size[1] + offset[1]
+    return pose
+
+
+def body_scale(pose: np.ndarray) -> float:
+    """몸통 길이 (어깨 중심 ~ 골반 중심, 픽셀). 거리에 따른 선수 크기 차이를 정규화하는 기준"""
+    shoulders = (pose[LEFT_SHOULDER, :2] + pose[RIGHT_SHOULDER, :2]) / 2
+    hips = (pose[LEFT_HIP, :2] + pose[RIGHT_HIP, :2]) / 2
+    torso = float(np.linalg.norm(shoulders - hips))
+    shoulder_width = float(np.linalg.norm(pose[LEFT_SHOULDER, :2] - pose[RIGHT_SHOULDER, :2]))
+    # 옆으로 선 자세에서는 어깨 폭이 줄어들므로 둘 중 큰 값 사용
+    return max(torso, shoulder_width, 1.0)
+
+
+def segment_distances(p0: np.ndarray, p1: np.ndarray, q0: np.ndarray, q1: np.ndarray) -> np.ndarray:
+    """
+    선분 쌍 (p0-p1, q0-q1) 사이 최단 거리, 모든 인자는 (N, 2)
+    길이가 0인 선분(점)도 처리한다.
+    """
+    d1 = p1 - p0
+    d2 = q1 - q0
+    r = p0 - q0
+    a = np.einsum('ij,ij->i', d1, d1)
+    e = np.einsum('ij,ij->i', d2, d2)
+    f = np.einsum('ij,ij->i', d2, r)
+    c = np.einsum('ij,ij->i', d1, r)
+    b = np.einsum('ij,ij->i', d1, d2)
+    eps = 1e-9
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = a * e - b * b
+        s = np.where(denom > eps, np.clip((b * f - c * e) / denom, 0.0, 1.0), 0.0)
+        # 대상이 점(머리)이면 손목 선분 위 가장 가까운 점만 구함
+        s = np.where(e > eps, s, np.where(a > eps, np.clip(-c / a, 0.0, 1.0), 0.0))
+        t = np.where(e > eps, (b * s + f) / e, 0.0)
+
+        # t가 범위를 벗어나면 끝점으로 고정하고 s를 다시 계산
+        s = np.where(t < 0.0, np.where(a > eps, np.clip(-c / a, 0.0, 1.0), 0.0), s)
+        s = np.where(t > 1.0, np.where(a > eps, np.clip((b - c) / a, 0.0, 1.0), 0.0), s)
+        t = np.clip(t, 0.0, 1.0)
+
+    closest_p = p0 + d1 * s[:, None]
+    closest_q = q0 + d2 * t[:, None]
+    return np.linalg.norm(closest_p - closest_q, axis=1)
+
+
+class HitResolver:
+    """
+    두 선수의 골격으로 타격 판정
+    - 상대 선수마다 몸통 길이로 정규화한 머리(원)와 몸통(캡슐) 영역 생성
+    - 이전 프레임 ~ 현재 프레임 손목 이동 경로(선분)와 영역의 최단 거리를 한 번에 계산
+      (프레임 사이를 지나간 펀치도 판정되므로 낮은 FPS에서도 놓치지 않음)
+    - 겹친 깊이와 랜드마크 가시성으로 신뢰도 산출
+    """
+
+    def __init__(self, head_radius=HEAD_RADIUS, torso_radius=TORSO_RADIUS, glove_radius=GLOVE_RADIUS,
+                 min_visibility=MIN_VISIBILITY, min_confidence=MIN_HIT_CONFIDENCE):
+        self.head_radius = head_radius
+        self.torso_radius = torso_radius
+        self.glove_radius = glove_radius
+        self.min_visibility = min_visibility
+        self.min_confidence = min_confidence
+
+    def target_regions(self, pose: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        상대 선수의 타격 부위 (TARGETS 순서)
+        start/end: 부위 중심 선분 (머리는 길이 0), radius: 픽셀 반경, visibility: 부위 랜드마크 가시성
+        """
+        scale = body_scale(pose)
+        head_points = pose[[NOSE, LEFT_EAR, RIGHT_EAR]]
+        visible = head_points[:, 2] >= self.min_visibility
+        head = head_points[visible, :2].mean(axis=0) if visible.any() else pose[NOSE, :2]
+
+        shoulders = (pose[LEFT_SHOULDER, :2] + pose[RIGHT_SHOULDER, :2]) / 2
+        hips = (pose[LEFT_HIP, :2] + pose[RIGHT_HIP, :2]) / 2
+        torso_visibility = pose[[LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP], 2].mean()
+
+        return {
+            'start': np.array([head, shoulders], dtype=np.float32),
+            'end': np.array([head, hips], dtype=np.float32),
+            'radius': np.array([self.head_radius * scale, self.torso_radius * scale], dtype=np.float32),
+            'visibility': np.array([head_points[:, 2].max(), torso_visibility], dtype=np.float32),
+            'scale': scale
+        }
+
+    def resolve(self, attacks: List[Dict]) -> List[Dict]:
+        """
+        공격 목록을 한 번에 판정
+        attack: {'start': 이전 손목 (2,), 'end': 현재 손목 (2,), 'scale': 공격 선수 몸통 길이,
+                 'visibility': 손목 가시성, 'regions': 상대 target_regions()}
+        반환: 공격마다 {'hit': 'face'|'body'|None, 'confidence', 'distance'(상대 몸통 길이 단위)}
+        """
+        # 상대 골격이 없으면 판정하지 않음 (distance -1)
+        results = [{'hit': None, 'confidence': 0.0, 'distance': -1.0} for _ in attacks]
+        valid = [i for i, attack in enumerate(attacks) if attack.get('regions') is not None]
+        if not valid:
+            return results
+
+        n_targets = len(TARGETS)
+        # (공격 수 × 부위 수) 쌍으로 펼침
+        p0 = np.repeat(np.array([attacks[i]['start'] for i in valid], dtype=np.float32), n_targets, axis=0)
+        p1 = np.repeat(np.array([attacks[i]['end'] for i in valid], dtype=np.float32), n_targets, axis=0)
+        q0 = np.concatenate([attacks[i]['regions']['start'] for i in valid])
+        q1 = np.concatenate([attacks[i]['regions']['end'] for i in valid])
+        target_radius = np.concatenate([attacks[i]['regions']['radius'] for i in valid])
+        target_visibility = np.concatenate([attacks[i]['regions']['visibility'] for i in valid])
+        glove_radius = np.repeat([self.glove_radius * attacks[i]['scale'] for i in valid], n_targets)
+        wrist_visibility = np.repeat([attacks[i]['visibility'] for i in valid], n_targets)
+        opponent_scale = np.repeat([attacks[i]['regions']['scale'] for i in valid], n_targets)
+
+        distance = segment_distances(p0, p1, q0, q1)
+        reach = target_radius + glove_radius
+        # 경계에서 0.5, 부위 중심을 지나면 1.0
+        depth = np.clip(0.5 + 0.5 * (reach - distance) / reach, 0.0, 1.0)
+        visibility = np.minimum(wrist_visibility, target_visibility)
+        confidence = np.where((distance <= reach) & (visibility >= self.min_visibility), depth * visibility, 0.0)
+
+        confidence = confidence.reshape(len(valid), n_targets)
+        distance = (distance / opponent_scale).reshape(len(valid), n_targets)
+        # 신뢰도가 같으면 얼굴 우선 (TARGETS 순서)
+        best = confidence.argmax(axis=1)
+        for row, i in enumerate(valid):
+            score = float(confidence[row, best[row]])
+            results[i] = {
+                'hit': TARGETS[best[row]] if score >= self.min_confidence else None,
+                'confidence': score,
+                'distance': float(distance[row].min())
+            }
+        return results
@@ -0,0 +1,283 @@
+"""
+SSE/WebSocket 서버 부하 테스트: 유지한 동시 연결 수, 초당 전달 메시지 수, 서버 CPU (코어당 처리량, 연결 1000개당 코어)
+
+가짜 방 상태를 분석 서버와 같은 상태 저장소(state_backend)로 쓰고, 여러 클라이언트가 받은 메시지를 센다.
+--transport ws는 /api/ws에 permessage-deflate로 연결한다 (kbytes는 압축 해제 후 크기).
+서버 CPU는 --server-pid(uvicorn 마스터 PID, 워커 프로세스 포함)를 주면 /proc에서 측정한다 (Linux).
+--in-process는 서버를 같은 프로세스에서 실행하므로 STATE_BACKEND=local로 Redis 없이 측정할 수 있다
+(이때 CPU에는 클라이언트 부하도 포함된다).
+
+$ SERVER_WORKERS=4 python server.py &
+$ python load_test.py --clients 2000 --rooms 20 --rate 2 --duration 30 --server-pid $!
+$ python load_test.py --snapshot-clients 500 --rooms 20 --duration 30
+$ python load_test.py --transport ws --fields player1.hits,player2.hits --clients 1000 --server-pid $!
+$ STATE_BACKEND=local python load_test.py --in-process --clients 500 --rooms 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from urllib.parse import urlparse
+import msgpack
+import websockets
+from state_backend import get_state_backend
+
+ROOM_PREFIX = "loadtest-"
+
+
+class Counters:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.messages = 0
+        self.bytes = 0
+        self.snapshots = {200: 0, 304: 0}
+
+
+def process_tree_cpu(pid: int) -> float:
+    """프로세스와 모든 자식 프로세스의 누적 CPU 시간 (초)"""
+    total = 0.0
+    ticks = os.sysconf('SC_CLK_TCK')
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / ticks   # utime + stime
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+async def http_request(host: str, port: int, path: str, headers: dict = None):
+    reader, writer = await asyncio.open_connection(host, port)
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}:{port}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    return reader, writer, status, response_headers
+
+
+async def sse_client(host, port, path, counters: Counters, stop: asyncio.Event):
+    try:
+        reader, writer, status, _ = await http_request(host, port, path, {"Accept": "text/event-stream"})
+    except OSError:
+        counters.failed += 1
+        return
+    if status != 200:
+        counters.failed += 1
+        writer.close()
+        return
+
+    counters.connected += 1
+    try:
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            counters.bytes += len(line)
+            # chunked 인코딩 안의 SSE 이벤트 줄
+            if line.startswith(b"data:"):
+                counters.messages += 1
+    except (OSError, asyncio.CancelledError):
+        pass
+    finally:
+        counters.connected -= 1
+        writer.close()
+
+
+async def ws_client(url, request, counters: Counters, stop: asyncio.Event):
+    """/api/ws 구독 클라이언트 (MessagePack 프레임 수를 셈)"""
+    try:
+        websocket = await websockets.connect(url, max_size=None)
+    except (OSError, websockets.InvalidHandshake):
+        counters.failed += 1
+        return
+
+    counters.connected += 1
+    try:
+        await websocket.send(msgpack.packb(request))
+        while not stop.is_set():
+            frame = await websocket.recv()
+            counters.bytes += len(frame)
+            counters.messages += 1
+    except (websockets.ConnectionClosed, asyncio.CancelledError):
+        pass
+    finally:
+        counters.connected -= 1
+        await websocket.close()
+
+
+async def snapshot_client(host, port, room_name, counters: Counters, stop: asyncio.Event, interval=1.0):
+    """ETag로 조건부 조회를 반복하는 클라이언트"""
+    etag = None
+    while not stop.is_set():
+        try:
+            headers = {"Connection": "close"}
+            if etag:
+                headers["If-None-Match"] = etag
+            _, writer, status, response_headers = await http_request(host, port, f"/api/rooms/{room_name}", headers)
+            writer.close()
+            counters.snapshots[status] = counters.snapshots.get(status, 0) + 1
+            etag = response_headers.get("etag", etag)
+        except OSError:
+            counters.failed += 1
+        await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+
+
+async def publisher(backend, room_names, rate: float, stop: asyncio.Event):
+    """방마다 초당 rate번 펀치가 발생하는 상태 변경을 분석 서버와 같은 방식으로 기록"""
+    states = {
+        room_name: {player_id: {'punches': {'hook': 0}, 'hits': {'face': 0, 'body': 0}}
+                    for player_id in ('player1', 'player2')}
+        for room_name in room_names
+    }
+
+    def snapshot(room_name):
+        # PunchDetector.state_snapshot처럼 쓸 때마다 새 dict 전달 (local 모드는 복사 없이 보관)
+        return {player_id: {'punches': dict(player['punches']), 'hits': dict(player['hits'])}
+                for player_id, player in states[room_name].items()}
+
+    for room_name in room_names:
+        backend.open_room(room_name)
+        backend.write_room_state(room_name, snapshot(room_name))
+
+    interval = 1.0 / (rate * len(room_names))
+    while not stop.is_set():
+        room_name = random.choice(room_names)
+        player = states[room_name][random.choice(['player1', 'player2'])]
+        player['punches']['hook'] += 1
+        if random.random() < 0.4:
+            player['hits'][random.choice(['face', 'body'])] += 1
+        # 분석 서버처럼 동기 쓰기 (redis 모드에서는 이벤트 루프를 잠시 막음)
+        backend.write_room_state(room_name, snapshot(room_name))
+        await asyncio.sleep(interval)
+
+
+async def start_server(host, port):
+    """서버를 이 프로세스의 이벤트 루프에서 실행 (분석 루프는 제외)"""
+    import uvicorn
+    import server
+    server.run_analysis = False
+    uvicorn_server = uvicorn.Server(uvicorn.Config(server.app, host=host, port=port, log_level="warning"))
+    task = asyncio.create_task(uvicorn_server.serve())
+    while not uvicorn_server.started:
+        if task.done():
+            await task
+            raise RuntimeError("서버 시작 실패")
+        await asyncio.sleep(0.05)
+    return uvicorn_server, task
+
+
+async def run(args):
+    url = urlparse(args.url)
+    host, port = url.hostname, url.port or 80
+    backend = get_state_backend()
+    server_task = None
+    if args.in_process:
+        uvicorn_server, server_task = await start_server(host, port)
+        args.server_pid = os.getpid()
+    room_names = [f"{ROOM_PREFIX}{i}" for i in range(args.rooms)]
+    counters = Counters()
+    stop = asyncio.Event()
+
+    publish_task = asyncio.create_task(publisher(backend, room_names, args.rate, stop))
+    await asyncio.sleep(0.5)
+
+    clients = []
+    fields = [field for field in args.fields.split(',') if field] if args.fields else None
+    for i in range(args.clients):
+        room_name = room_names[i % len(room_names)]
+        if args.transport == 'ws':
+            request = {'rooms': [room_name] if args.mode == 'room' else None,
+                       'fields': fields, 'gym': args.mode == 'multi'}
+            client = ws_client(f"ws://{host}:{port}/api/ws", request, counters, stop)
+        else:
+            path = f"/api/stream/{room_name}" if args.mode == 'room' else "/api/stream"
+            client = sse_client(host, port, path, counters, stop)
+        clients.append(asyncio.create_task(client))
+        if i % 100 == 99:
+            await asyncio.sleep(0.05)   # 연결 폭주 방지
+    for i in range(args.snapshot_clients):
+        clients.append(asyncio.create_task(snapshot_client(host, port, room_names[i % len(room_names)], counters, stop)))
+    await asyncio.sleep(args.warmup)
+
+    # 측정 구간
+    start_messages, start_bytes = counters.messages, counters.bytes
+    start_snapshots = dict(counters.snapshots)
+    start_cpu = process_tree_cpu(args.server_pid) if args.server_pid else None
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - start
+    cpu = process_tree_cpu(args.server_pid) - start_cpu if args.server_pid else None
+
+    messages = counters.messages - start_messages
+    result = {
+        'transport': args.transport,
+        'mode': args.mode,
+        'rooms': args.rooms,
+        'connected': counters.connected,
+        'failed': counters.failed,
+        'messages_per_sec': round(messages / elapsed, 1),
+        'kbytes_per_sec': round((counters.bytes - start_bytes) / elapsed / 1024, 1),
+        'snapshots_per_sec': {str(status): round((count - start_snapshots.get(status, 0)) / elapsed, 1)
+                              for status, count in counters.snapshots.items()},
+    }
+    if cpu is not None:
+        result['server_cores'] = round(cpu / elapsed, 2)
+        result['messages_per_sec_per_core'] = round(messages / cpu, 1) if cpu > 0 else None
+        result['connections_per_core'] = round(counters.connected / (cpu / elapsed), 1) if cpu > 0 else None
+        if counters.connected:
+            result['server_cores_per_1000_clients'] = round(cpu / elapsed / counters.connected * 1000, 3)
+
+    stop.set()
+    for task in clients:
+        task.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+    await publish_task
+    for room_name in room_names:
+        backend.close_room(room_name)
+    if server_task is not None:
+        uvicorn_server.should_exit = True
+        await server_task
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, default=1000, help='SSE/WebSocket 연결 수')
+    parser.add_argument('--transport', choices=['sse', 'ws'], default='sse')
+    parser.add_argument('--fields', help='ws 구독 필드 (쉼표 구분, 예: player1.hits,player2.hits)')
+    parser.add_argument('--snapshot-clients', type=int, default=0, help='ETag로 스냅샷을 조회하는 클라이언트 수')
+    parser.add_argument('--mode', choices=['room', 'multi'], default='room',
+                        help='room: 방 하나, multi: 모든 방 + 체육관 집계 (/api/stream 또는 /api/ws)')
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=2.0, help='방별 초당 상태 변경 수')
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--server-pid', type=int, help='서버(uvicorn 마스터) PID, 워커 CPU 포함 측정')
+    parser.add_argument('--in-process', action='store_true',
+                        help='서버를 이 프로세스에서 실행 (STATE_BACKEND=local이면 Redis 불필요)')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,99 +5,165 @@ import cv2
 import numpy as np
 from livekit import api, rtc
 from punch_detector import PunchDetector
+from event_log import EventLogWriter
+from rollup import RollupStore, RoomRollup
+from clip_buffer import FrameRingBuffer, ClipWriter
+from camera_arbiter import CameraArbiter
+from scheduler import InferenceScheduler, DEFAULT_ROOM_PRIORITY
+from capture import CaptureWriter
+from pipeline import FramePipeline, load_pipeline_config, shutdown_process_pools
+from state_backend import get_state_backend
+from utils import i420_to_bgr, missing_livekit_config
 import time
 import signal
 import json
-import redis
 
 load_dotenv()
 
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "127.0.0.1"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
-    db=int(os.getenv("REDIS_DB", 0)),
-)
+# 방 상태 저장소 (STATE_BACKEND=redis|local)
+state_backend = get_state_backend()
 
+# LiveKit API 클라이언트는 환경 변수(.env 포함)에서 키를 읽음 (누락 여부는 실행 전에 확인)
 LIVEKIT_URL = os.getenv("LIVEKIT_URL")
-LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
-LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
-
-os.environ["LIVEKIT_URL"] = LIVEKIT_URL
-os.environ["LIVEKIT_API_KEY"] = LIVEKIT_API_KEY
-os.environ["LIVEKIT_API_SECRET"] = LIVEKIT_API_SECRET
 
 PARTICIPANT_IDENTITY = os.getenv("PARTICIPANT_IDENTITY", "default_identity")
 PARTICIPANT_NAME = os.getenv("PARTICIPANT_NAME", "default_name")
 
 FRAME_INTERVAL = 0.05
+# 분석에 사용하지 않는 카메라의 게이팅 간격
+GATE_INTERVAL = 0.25
 
 shutdown_event = asyncio.Event()
 rooms = dict()
+room_recorders = dict()
+room_arbiters = dict()
+room_captures = dict()
+room_pipelines = dict()
+rollup_store = None
+scheduler = InferenceScheduler()
+# 단계별 실행기 설정 (PIPELINE_CONFIG)
+pipeline_config = load_pipeline_config()
+
+def room_state(detector, arbiter):
+    """상태 저장소에 쓸 방 상태 (프레임마다 새로 만든 dict, 카메라가 여러 대면 카메라 정보 포함)"""
+    state = detector.state_snapshot()
+    if arbiter is not None and len(arbiter.feeds) > 1:
+        state['cameras'] = arbiter.summary()
+    return state
 
 async def frame_processor(detector, room_name):
+    arbiter = room_arbiters.get(room_name)
+
+    def publish(ctx):
+        """파이프라인에서 프레임 처리가 끝나면 호출"""
+        capture = room_captures.get(room_name)
+        if capture is not None and ctx['capture_seq'] is not None:
+            capture.write_timings(ctx['capture_seq'], ctx['timestamp'], {
+                'convert': ctx['convert'],
+                'queue_wait': ctx['queue_wait'],
+                **ctx['timings']
+            })
+
+        scheduler.record(room_name)
+        # track 단계가 이 프레임에서 계산한 화질만 반영 (건너뛴 프레임은 다시 보고하지 않음)
+        if arbiter is not None and ctx.get('quality') is not None:
+            arbiter.report(ctx['quality'], ctx['track_sid'])
+        state_backend.write_room_state(room_name, room_state(detector, arbiter))
+
+    pipeline = FramePipeline(detector, pipeline_config, on_result=publish, name=room_name)
+    pipeline.start()
+    room_pipelines[room_name] = pipeline
     try:
         while not shutdown_event.is_set():
             if detector.processing_queue.empty():
                 await asyncio.sleep(0.01)
                 continue
             
-            frame = await detector.processing_queue.get()
-            if frame is None:
+            item = await detector.processing_queue.get()
+            if item is None:
+                continue
+            # (촬영 시각, BGR 프레임, 캡처 프레임 번호, 변환 시간, 카메라)
+            timestamp, frame, capture_seq, convert_time, track_sid = item
+            # 카메라 전환 전에 큐에 들어온 이전 카메라 프레임은 버림
+            if arbiter is not None and not arbiter.is_active(track_sid):
                 continue
+            queue_wait = time.time() - timestamp
+            
+            if detector.frame_buffer is not None:
+                detector.frame_buffer.push(frame, timestamp)
             
             try:
-                # 데이터 타입 변환 (float64 → uint8)
-                if frame.dtype != np.uint8:
-                    frame = (frame * 255).astype(np.uint8)
-
-                # NumPy로 밝기와 대비 조정
-                frame = frame * 1.2 + 10
-                frame = np.clip(frame, 0, 255).astype(np.uint8) 
-
-                # OpenCV로 블러 적용
-                frame = cv2.blur(frame, (3, 3)) 
-
-
-                result = await detector.process_frame_async(frame)
-                if result:
-                    await detector.result_queue.put(result)
-
-                if not detector.result_queue.empty():
-                    result = await detector.result_queue.get()
-                    redis_client.set(room_name, json.dumps(detector.players))
+                # 첫 단계 큐가 차 있으면 여기서 대기 (입력 쪽에서 프레임을 건너뜀)
+                await pipeline.submit({
+                    'frame': frame,
+                    'timestamp': timestamp,
+                    'capture_seq': capture_seq,
+                    'convert': convert_time,
+                    'queue_wait': queue_wait,
+                    'track_sid': track_sid
+                })
             except Exception as e:
                 print(f"프레임 처리 오류: {e}")
     except asyncio.CancelledError:
         print("frame_processor task cancelled.")
+    finally:
+        room_pipelines.pop(room_name, None)
+        await pipeline.stop()
 
-async def process_video_frames(video_stream: rtc.VideoStream, detector):   
+async def process_video_frames(video_stream: rtc.VideoStream, detector, arbiter: CameraArbiter, track_sid: str, room_name: str):
+    """
+    카메라(트랙)별 프레임 수신
+    - 선택된 카메라: 방에 배분된 FPS로 BGR 변환 후 분석 큐로 전달
+    - 나머지 카메라: 밝기 평면으로 움직임만 게이팅, 주기적으로 YOLO 가시성 평가
+    """
     last_processed_time = 0  # 마지막으로 프레임을 처리한 시간
-    async for frame_event in video_stream:
-        
-        current_time = time.time()
-        
-        # 설정한 간격이 지나지 않았다면 다음 프레임으로 넘어감
-        if current_time - last_processed_time < FRAME_INTERVAL:
-            continue
-        # VideoFrameEvent 객체에서 frame 데이터 추출
-        frame_obj = frame_event.frame 
+    try:
+        async for frame_event in video_stream:
+            
+            current_time = time.time()
+            if arbiter.is_active(track_sid):
+                interval = scheduler.interval(room_name, FRAME_INTERVAL)
+            else:
+                interval = GATE_INTERVAL
+            
+            # 설정한 간격이 지나지 않았다면 다음 프레임으로 넘어감
+            if current_time - last_processed_time < interval:
+                continue
+            # VideoFrameEvent 객체에서 frame 데이터 추출
+            frame_obj = frame_event.frame 
 
-        yuv_data = np.frombuffer(frame_obj.data, dtype=np.uint8)
-        height = frame_obj.height
-        width = frame_obj.width
-        yuv_image = yuv_data.reshape((height + height // 2, width))
-        bgr_image = cv2.cvtColor(yuv_image, cv2.COLOR_YUV2BGR_I420)
+            yuv_data = np.frombuffer(frame_obj.data, dtype=np.uint8)
+            height = frame_obj.height
+            width = frame_obj.width
+            yuv_image = yuv_data.reshape((height + height // 2, width))
+            arbiter.gate(track_sid, yuv_image[:height])
 
-        if not detector.processing_queue.full():
-            await detector.processing_queue.put(bgr_image)
+            if arbiter.is_active(track_sid):
+                if not detector.processing_queue.full():
+                    capture = room_captures.get(room_name)
+                    capture_seq = None
+                    if capture is not None:
+                        capture_seq = capture.write_frame(current_time, width, height, frame_obj.data)
 
-        last_processed_time = current_time
+                    stage_start = time.perf_counter()
+                    bgr_image = i420_to_bgr(frame_obj.data, width, height)
+                    convert_time = time.perf_counter() - stage_start
+                    await detector.processing_queue.put((current_time, bgr_image, capture_seq, convert_time, track_sid))
+            elif arbiter.wants_probe(track_sid):
+                bgr_image = cv2.cvtColor(yuv_image, cv2.COLOR_YUV2BGR_I420)
+                asyncio.ensure_future(arbiter.probe(track_sid, bgr_image))
+
+            last_processed_time = current_time
+    finally:
+        arbiter.remove_feed(track_sid)
 
 
     cv2.destroyAllWindows()
 
 async def main(rtc_room: rtc.Room, room_name) -> None:
     processor_task = asyncio.create_task(frame_processor(rooms[room_name], room_name))
+    for recorder in room_recorders[room_name]:
+        recorder.start()
 
     @rtc_room.on("track_subscribed")
     def on_track_subscribed(
@@ -107,14 +173,21 @@ async def main(rtc_room: rtc.Room, room_name) -> None:
     ):
         if track.kind == rtc.TrackKind.KIND_VIDEO:
             _video_stream = rtc.VideoStream(track)
-            asyncio.ensure_future(process_video_frames(_video_stream, rooms[room_name]))
+            arbiter = room_arbiters[room_name]
+            arbiter.add_feed(publication.sid, participant.identity)
+            asyncio.ensure_future(process_video_frames(_video_stream, rooms[room_name], arbiter, publication.sid, room_name))
 
     @rtc_room.on("disconnected")
     def on_disconnected() -> None:
         shutdown_event.set()
         processor_task.cancel()
         rooms.pop(room_name)
-        redis_client.delete(room_name)
+        room_arbiters.pop(room_name, None)
+        scheduler.release(room_name)
+        if room_name in room_captures:
+            room_captures.pop(room_name).close()
+        state_backend.close_room(room_name)
+        asyncio.ensure_future(close_recorders(room_recorders.pop(room_name)))
 
     token = (
         api.AccessToken()
@@ -139,34 +212,111 @@ async def connect_and_process_room(room_name):
     rtc_room = rtc.Room()
     await main(rtc_room, room_name)
 
+def create_detector(room_name):
+    """방 분석기와 이벤트 기록기(이벤트 로그, 시계열 집계, 하이라이트 클립) 생성"""
+    global rollup_store
+    if rollup_store is None:
+        rollup_store = RollupStore()
+
+    # 입력 FPS는 스케줄러가 배분하므로 감지기에서 다시 건너뛰지 않음 (배분량 = 분석 FPS)
+    detector = PunchDetector(frame_skip=1)
+    event_log = EventLogWriter(room_name)
+    rollup = RoomRollup(room_name, rollup_store, session=int(event_log.started_at))
+    detector.frame_buffer = FrameRingBuffer(room_name)
+    clip_writer = ClipWriter(detector.frame_buffer)
+    room_recorders[room_name] = [event_log, rollup, clip_writer]
+    room_arbiters[room_name] = CameraArbiter(detector)
+    detector.event_handlers.extend(room_recorders[room_name])
+    return detector
+
+async def close_recorders(recorders):
+    for recorder in recorders:
+        await recorder.close()
+
+def room_priority(room) -> int:
+    """LiveKit 방 metadata의 priority (예: {"priority": 2})"""
+    try:
+        return int(json.loads(room.metadata or "{}").get("priority", DEFAULT_ROOM_PRIORITY))
+    except (ValueError, TypeError, AttributeError):
+        return DEFAULT_ROOM_PRIORITY
+
+def update_captures():
+    """상태 저장소의 캡처 요청 방 목록에 따라 방별 입력 캡처 시작/종료"""
+    capture_rooms = state_backend.capture_rooms()
+    for room_name in capture_rooms:
+        if room_name in rooms and room_name not in room_captures:
+            room_captures[room_name] = CaptureWriter(room_name, initial_state=rooms[room_name].capture_state())
+            print(f"입력 캡처 시작: {room_name} -> {room_captures[room_name].path}")
+    for room_name in list(room_captures):
+        if room_name not in capture_rooms or room_name not in rooms:
+            room_captures.pop(room_name).close()
+
+def update_rounds():
+    """라운드 시작 요청(POST /api/rooms/{room}/round)을 방 분석기에 반영"""
+    for room_name, round_no in state_backend.room_rounds().items():
+        detector = rooms.get(room_name)
+        if detector is not None and detector.round != round_no:
+            detector.start_round(round_no)
+            print(f"라운드 시작: {room_name} -> {round_no}")
+
 async def poll_rooms():
     lkapi = api.LiveKitAPI()
     while not shutdown_event.is_set():
         try:
             roomlist = await lkapi.room.list_rooms(api.ListRoomsRequest())
-            current_rooms = {room.name for room in roomlist.rooms}
-            for current_room in current_rooms:
+            current_rooms = {room.name: room for room in roomlist.rooms}
+            for current_room, room_info in current_rooms.items():
                 if current_room not in rooms:
-                    rooms[current_room] = PunchDetector()
-                    redis_client.set(current_room, json.dumps({}))
+                    # 호스트 예산이 부족하면 새 방은 받지 않음 (다음 폴링에서 재시도)
+                    if not scheduler.admit(current_room, room_priority(room_info)):
+                        print(f"분석 용량 부족으로 방 거절: {current_room}")
+                        continue
+                    rooms[current_room] = create_detector(current_room)
+                    state_backend.open_room(current_room)
                     asyncio.create_task(connect_and_process_room(current_room))
 
+            for rejected_room in list(scheduler.rejected):
+                if rejected_room not in current_rooms:
+                    scheduler.rejected.pop(rejected_room)
+            # metadata 우선순위 변경과 방별 실제 분석 FPS를 반영해 다시 배분
+            scheduler.refresh({room_name: room_priority(room_info)
+                               for room_name, room_info in current_rooms.items()})
+            state_backend.set_scheduler(scheduler.snapshot())
+            state_backend.set_pipeline_stats({
+                room_name: pipeline.stats() for room_name, pipeline in room_pipelines.items()
+            })
+            update_captures()
+            update_rounds()
+
         except Exception as e:
             print(f"Error while polling rooms: {e}")
 
         await asyncio.sleep(3)
 
+    # 남은 이벤트 기록
+    for recorders in list(room_recorders.values()):
+        await close_recorders(recorders)
+    room_recorders.clear()
+    for capture in list(room_captures.values()):
+        capture.close()
+        await capture.wait_closed()
+    room_captures.clear()
+    shutdown_process_pools()
+
 def shutdown_handler():
-    redis_client.flushdb()
+    state_backend.clear()
     shutdown_event.set()
 
 if __name__ == "__main__":
+    missing = missing_livekit_config()
+    if missing:
+        raise SystemExit(f"LiveKit 설정이 없습니다: {', '.join(missing)} (.env 확인)")
     signal.signal(signal.SIGINT, lambda s, f: shutdown_handler())
     signal.signal(signal.SIGTERM, lambda s, f: shutdown_handler())
-    redis_client.flushdb()
+    state_backend.clear()
     try:
         asyncio.run(poll_rooms())
     except Exception as e:
         print(f"Unexpected error: {e}")
     finally:
-        redis_client.flushdb()
\ No newline at end of file
+        state_backend.clear()
\ No newline at end of file
@@ -0,0 +1,308 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from hit_resolver import pose_to_array
+from punch_detector import PunchDetector, create_person_model, create_pose_model, parse_person_boxes
+
+STAGES = PunchDetector.STAGES
+EXECUTORS = ('inline', 'thread', 'process')
+# 선수 상태나 MediaPipe 추적 상태를 가진 단계 (워커 1개만 허용)
+SERIAL_STAGES = ('ingest', 'pose', 'track', 'classify', 'publish')
+# 선수 상태(PunchDetector.players, motion)를 바꾸거나 직렬화하는 단계 (이벤트 루프에서만 실행)
+LOOP_STAGES = ('ingest', 'track', 'classify', 'publish')
+# 입력/결과만 주고받으므로 별도 프로세스에서 실행 가능한 단계
+PROCESS_STAGES = ('detect', 'pose')
+
+# executor: inline(이벤트 루프), thread(단계 전용 스레드 풀), process(프로세스 풀)
+# workers: 동시 실행 수, queue: 단계 입력 큐 크기
+DEFAULT_PIPELINE_CONFIG = {
+    'ingest': {'executor': 'inline', 'workers': 1, 'queue': 2},
+    'detect': {'executor': 'thread', 'workers': 1, 'queue': 2},
+    'pose': {'executor': 'thread', 'workers': 1, 'queue': 2},
+    'track': {'executor': 'inline', 'workers': 1, 'queue': 2},
+    'classify': {'executor': 'inline', 'workers': 1, 'queue': 2},
+    'publish': {'executor': 'inline', 'workers': 1, 'queue': 2},
+}
+
+
+def validate_pipeline_config(config: Dict):
+    for stage in STAGES:
+        spec = config.get(stage)
+        if spec is None:
+            raise ValueError(f"파이프라인 단계 설정이 없습니다: {stage}")
+        if spec.get('executor') not in EXECUTORS:
+            raise ValueError(f"{stage}: executor는 {', '.join(EXECUTORS)} 중 하나여야 합니다")
+        if spec['executor'] != 'inline' and stage in LOOP_STAGES:
+            raise ValueError(f"{stage}: 선수 상태를 바꾸는 단계라 executor는 inline이어야 합니다")
+        if spec['executor'] == 'process' and stage not in PROCESS_STAGES:
+            raise ValueError(f"{stage}: process 실행은 {', '.join(PROCESS_STAGES)} 단계만 가능합니다")
+        if int(spec.get('workers', 1)) < 1 or int(spec.get('queue', 1)) < 1:
+            raise ValueError(f"{stage}: workers와 queue는 1 이상이어야 합니다")
+        if stage in SERIAL_STAGES and int(spec.get('workers', 1)) > 1:
+            raise ValueError(f"{stage}: 상태를 가진 단계라 workers는 1이어야 합니다")
+
+
+def load_pipeline_config(value: Optional[str] = None) -> Dict:
+    """
+    기본 설정 위에 PIPELINE_CONFIG(JSON 문자열 또는 JSON 파일 경로)를 단계별로 덮어씀
+    예: PIPELINE_CONFIG='{"detect": {"executor": "process", "workers": 2, "queue": 4}}'
+    """
+    value = os.getenv("PIPELINE_CONFIG", "") if value is None else value
+    overrides = {}
+    if value:
+        if os.path.isfile(value):
+            with open(value) as f:
+                overrides = json.load(f)
+        else:
+            overrides = json.loads(value)
+
+    unknown = set(overrides) - set(STAGES)
+    if unknown:
+        raise ValueError(f"알 수 없는 파이프라인 단계: {', '.join(sorted(unknown))}")
+
+    config = {stage: {**DEFAULT_PIPELINE_CONFIG[stage], **overrides.get(stage, {})} for stage in STAGES}
+    validate_pipeline_config(config)
+    return config
+
+
+# 프로세스 풀 워커 안에서 지연 생성하는 모델
+_process_models = {}
+# 모든 방이 공유하는 프로세스 풀 (단계, 워커 수) -> 풀
+_process_pools = {}
+
+
+def _detect_in_process(frame):
+    model = _process_models.get('person')
+    if model is None:
+        model = _process_models['person'] = create_person_model()
+    return parse_person_boxes(model(frame))
+
+
+def _pose_in_process(pipeline_name, player_id, crop, offset):
+    # 방(파이프라인)과 선수마다 Pose 인스턴스를 따로 둬 추적 상태가 섞이지 않게 함
+    key = ('pose', pipeline_name, player_id)
+    model = _process_models.get(key)
+    if model is None:
+        model = _process_models[key] = create_pose_model()
+    return pose_to_array(model.process(crop).pose_landmarks, offset, (crop.shape[1], crop.shape[0]))
+
+
+def _release_in_process(pipeline_name):
+    """방(파이프라인)이 끝나면 워커 프로세스의 Pose 인스턴스 정리"""
+    for key in [key for key in _process_models if isinstance(key, tuple) and key[1] == pipeline_name]:
+        _process_models.pop(key).close()
+
+
+def get_process_pool(stage: str, workers: int) -> ProcessPoolExecutor:
+    pool = _process_pools.get((stage, workers))
+    if pool is None:
+        # YOLO/MediaPipe 스레드가 떠 있는 프로세스를 fork하지 않도록 spawn 사용
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _process_pools[(stage, workers)] = pool
+    return pool
+
+
+def shutdown_process_pools():
+    for pool in _process_pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _process_pools.clear()
+
+
+class PipelineStage:
+    """파이프라인 단계 한 개 (입력 큐, 실행 함수, 처리량 통계)"""
+
+    def __init__(self, name: str, spec: Dict, call: Callable):
+        self.name = name
+        self.executor = spec['executor']
+        self.workers = int(spec.get('workers', 1))
+        self.queue = asyncio.Queue(maxsize=int(spec.get('queue', 2)))
+        self.call = call
+
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.wait = 0.0
+        self.completed = deque(maxlen=100)   # 최근 처리 완료 시각 (FPS 계산용)
+        # 워커가 여러 개일 때 프레임 순서 복원용
+        self.next_seq = 0
+        self.pending = {}
+        # 다음 단계로 넘기는 워커를 하나로 제한 (put 대기 중 다른 워커가 뒤 프레임을 먼저 넣지 않도록)
+        self.forward_lock = asyncio.Lock()
+
+    def record(self, started: float):
+        now = time.perf_counter()
+        self.processed += 1
+        self.busy += now - started
+        self.completed.append(now)
+
+    def stats(self) -> Dict:
+        fps = 0.0
+        if len(self.completed) > 1:
+            fps = (len(self.completed) - 1) / max(self.completed[-1] - self.completed[0], 1e-6)
+        return {
+            'executor': self.executor,
+            'workers': self.workers,
+            'queue': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'processed': self.processed,
+            'failed': self.failed,
+            'fps': round(fps, 2),
+            'avg_ms': round(self.busy / self.processed * 1000, 2) if self.processed else 0.0,
+            'avg_wait_ms': round(self.wait / self.processed * 1000, 2) if self.processed else 0.0
+        }
+
+
+class FramePipeline:
+    """
+    PunchDetector의 단계(ingest → detect → pose → track → classify → publish)를
+    설정된 실행기에서 실행하고, 단계 사이를 크기가 제한된 큐로 연결
+    프레임 N의 포즈 추정과 프레임 N+1의 사람 감지가 겹쳐서 실행된다.
+    """
+
+    def __init__(self, detector: PunchDetector, config: Optional[Dict] = None,
+                 on_result: Optional[Callable] = None, name: Optional[str] = None):
+        self.detector = detector
+        self.config = config or load_pipeline_config()
+        validate_pipeline_config(self.config)
+        self.on_result = on_result
+        self.name = name or f"pipeline-{id(self)}"
+
+        self.thread_pools = []
+        self.model_pools = []   # 이 파이프라인 전용 모델을 가진 프로세스 풀 (종료 시 정리)
+        self.stages = [PipelineStage(stage, self.config[stage], self._make_call(stage, self.config[stage]))
+                       for stage in STAGES]
+        self.tasks = []
+        self.next_seq = 0
+        self.in_flight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def _make_call(self, stage: str, spec: Dict) -> Callable:
+        stage_fn = getattr(self.detector, f'stage_{stage}')
+        executor = spec['executor']
+        workers = int(spec.get('workers', 1))
+
+        if executor == 'inline':
+            async def call(ctx):
+                return stage_fn(ctx)
+        elif executor == 'thread':
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{self.name}-{stage}")
+            self.thread_pools.append(pool)
+
+            async def call(ctx):
+                return await asyncio.get_event_loop().run_in_executor(pool, stage_fn, ctx)
+        elif stage == 'detect':
+            pool = get_process_pool(stage, workers)
+
+            async def call(ctx):
+                ctx['person_boxes'] = await asyncio.get_event_loop().run_in_executor(
+                    pool, _detect_in_process, ctx['frame'])
+                return ctx
+        else:
+            pool = get_process_pool(stage, workers)
+            self.model_pools.append(pool)
+
+            async def call(ctx):
+                for player_id, crop, offset in self.detector.prepare_pose(ctx):
+                    ctx['poses'][player_id] = await asyncio.get_event_loop().run_in_executor(
+                        pool, _pose_in_process, self.name, player_id, crop, offset)
+                return ctx
+        return call
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self.tasks.append(asyncio.ensure_future(self._worker(index)))
+
+    async def submit(self, ctx: Dict):
+        """
+        프레임 투입 (첫 단계 큐가 차 있으면 대기)
+        ctx에는 최소한 'frame'과 'timestamp'가 있어야 하며, 처리가 끝나면 on_result(ctx)가 호출된다.
+        """
+        ctx['seq'] = self.next_seq
+        self.next_seq += 1
+        ctx.setdefault('timings', {})
+        ctx['submitted'] = ctx['enqueued'] = time.perf_counter()
+        self.in_flight += 1
+        self.idle.clear()
+        await self.stages[0].queue.put(ctx)
+
+    async def _worker(self, index: int):
+        stage = self.stages[index]
+        while True:
+            ctx = await stage.queue.get()
+            started = time.perf_counter()
+            # 건너뛴 프레임도 순서 복원을 위해 끝까지 전달
+            if not ctx.get('skip'):
+                stage.wait += started - ctx['enqueued']
+                try:
+                    ctx = await stage.call(ctx)
+                    ctx['timings'][stage.name] = time.perf_counter() - started
+                    stage.record(started)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Error in pipeline stage {stage.name}: {e}")
+                    stage.failed += 1
+                    ctx['skip'] = True
+            await self._forward(index, ctx)
+
+    async def _forward(self, index: int, ctx: Dict):
+        """다음 단계로 전달 (워커가 여러 개인 단계는 프레임 순서를 복원)"""
+        stage = self.stages[index]
+        stage.pending[ctx['seq']] = ctx
+        async with stage.forward_lock:
+            while stage.next_seq in stage.pending:
+                ready = stage.pending.pop(stage.next_seq)
+                stage.next_seq += 1
+                if index + 1 < len(self.stages):
+                    ready['enqueued'] = time.perf_counter()
+                    await self.stages[index + 1].queue.put(ready)
+                else:
+                    await self._finish(ready)
+
+    async def _finish(self, ctx: Dict):
+        try:
+            if not ctx.get('skip'):
+                ctx['timings']['total'] = time.perf_counter() - ctx['submitted']
+                self.detector.stage_timings = ctx['timings']
+                if self.on_result is not None:
+                    result = self.on_result(ctx)
+                    if asyncio.iscoroutine(result):
+                        await result
+        except Exception as e:
+            print(f"Error in pipeline result handler: {e}")
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.idle.set()
+
+    async def drain(self):
+        """투입한 프레임이 모두 처리될 때까지 대기"""
+        await self.idle.wait()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        for pool in self.thread_pools:
+            pool.shutdown(wait=False)
+        for pool in self.model_pools:
+            try:
+                await asyncio.get_event_loop().run_in_executor(pool, _release_in_process, self.name)
+            except Exception as e:
+                print(f"Error while releasing pipeline models: {e}")
+        self.model_pools.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'submitted': self.next_seq,
+            'in_flight': self.in_flight,
+            'stages': {stage.name: stage.stats() for stage in self.stages}
+        }
@@ -1,7 +1,8 @@
 import numpy as np
-from collections import deque
+import time
 from typing import Dict, List, Tuple
 import cv2
+from history_buffer import PlayerHistory, landmarks_to_array
 
 class EnhancedPlayerTracker:
     def __init__(self, max_history=30, max_players=2):
@@ -11,9 +12,9 @@ class EnhancedPlayerTracker:
         self.track_ids = set()
         
     def calculate_pose_similarity(self, pose1, pose2):
-        """포즈 간 유사도 계산"""
-        keypoints1 = np.array([[lm.x, lm.y] for lm in pose1])
-        keypoints2 = np.array([[lm.x, lm.y] for lm in pose2])
+        """포즈 간 유사도 계산 ((33, 3) 랜드마크 배열)"""
+        keypoints1 = pose1[:, :2]
+        keypoints2 = pose2[:, :2]
         
         # Procrustes 분석으로 포즈 정렬 및 유사도 계산
         similarity = self._procrustes_similarity(keypoints1, keypoints2)
@@ -36,26 +37,42 @@ class EnhancedPlayerTracker:
         similarity = np.sum((X_n @ R - Y_n) ** 2)
         return similarity
     
+    def _record_pose(self, player, det, pose, timestamp):
+        """포즈 기록을 링 버퍼에 추가"""
+        bbox = det.get('bbox')
+        if bbox is not None:
+            center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+        else:
+            bbox = (0, 0, 0, 0)
+            center = pose[:, :2].mean(axis=0)
+        player['pose_history'].append(bbox, center, det['confidence'], pose, timestamp)
+        # 마지막 포즈는 링 버퍼 슬롯을 그대로 참조 (복사 없음)
+        player['last_pose'] = player['pose_history'].latest_landmarks()
+
     def update(self, detections: List[Dict]):
         """선수 추적 업데이트"""
+        now = time.time()
+        poses = [landmarks_to_array(det['landmarks']) for det in detections]
+
         if not self.players:  # 초기화
             for i, det in enumerate(detections[:self.max_players]):
                 track_id = i
                 self.track_ids.add(track_id)
                 self.players[track_id] = {
-                    'pose_history': deque(maxlen=self.max_history),
+                    'pose_history': PlayerHistory(self.max_history),
                     'position': 'left' if i == 0 else 'right',
-                    'last_pose': det['landmarks'],
+                    'last_pose': None,
                     'confidence': det['confidence'],
                     'lost_frames': 0
                 }
+                self._record_pose(self.players[track_id], det, poses[i], now)
         else:
             # 현재 프레임의 detection을 이전 선수들과 매칭
             cost_matrix = np.zeros((len(detections), len(self.players)))
             for i, det in enumerate(detections):
                 for j, (track_id, player) in enumerate(self.players.items()):
                     cost_matrix[i, j] = self.calculate_pose_similarity(
-                        det['landmarks'], player['last_pose']
+                        poses[i], player['last_pose']
                     )
             
             # Hungarian 알고리즘으로 최적 매칭
@@ -69,10 +86,10 @@ class EnhancedPlayerTracker:
                     track_id = list(self.players.keys())[j]
                     matched_track_ids.add(track_id)
                     self.players[track_id].update({
-                        'last_pose': detections[i]['landmarks'],
                         'confidence': detections[i]['confidence'],
                         'lost_frames': 0
                     })
+                    self._record_pose(self.players[track_id], detections[i], poses[i], now)
             
             # 매칭되지 않은 선수 처리
             for track_id in self.track_ids - matched_track_ids:
@@ -4,22 +4,70 @@ import cv2
 from ultralytics import YOLO
 import time
 import asyncio
+import threading
+from utils import preprocess_frame
+from hit_resolver import HitResolver, LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_ELBOW, RIGHT_ELBOW, \
+    LEFT_WRIST, RIGHT_WRIST, body_scale, pose_to_array
+
+# 손목 이동 경로(이전 → 현재 손목)로 인정하는 최대 프레임 간격 (초)
+# 포즈를 놓쳤다가 다시 찾으면 오래된 손목 위치와 이어진 긴 경로가 잘못된 타격으로 판정될 수 있음
+MAX_SWEEP_DT = 0.5
+
+def create_person_model():
+    """YOLO 초기화 (person 감지용)"""
+    person_model = YOLO('yolov8n.pt')
+    person_model.classes = [0]  # person class만 사용
+    person_model.conf = 0.3     # 신뢰도 임계값 낮춤
+    person_model.iou = 0.45
+    return person_model
+
+def create_pose_model():
+    """MediaPipe 포즈 모델 초기화"""
+    return mp.solutions.pose.Pose(
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+        model_complexity=1
+    )
+
+def parse_person_boxes(person_results):
+    """YOLO 결과에서 사람 바운딩 박스 추출"""
+    person_boxes = []
+    for box in person_results[0].boxes:
+        if box.cls[0] == 0:  # person class
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            conf = float(box.conf[0])
+            center_x = (x1 + x2) / 2
+            
+            person_boxes.append({
+                'bbox': (x1, y1, x2, y2),
+                'center_x': center_x,
+                'conf': conf
+            })
+    return person_boxes
+
+def assign_players(person_boxes):
+    """왼쪽/오른쪽 위치 기반 선수 구분 (두 명 이상 감지된 경우만, 최대 2명)"""
+    if len(person_boxes) < 2:
+        return []
+    sorted_boxes = sorted(person_boxes, key=lambda x: x['center_x'])
+    return [('player1' if i == 0 else 'player2', box) for i, box in enumerate(sorted_boxes[:2])]
+
+def crop_player(frame, bbox, margin=0.1):
+    """선수 바운딩 박스를 여유 있게 잘라낸 이미지와 원본 기준 좌상단 좌표"""
+    x1, y1, x2, y2 = bbox
+    pad_x, pad_y = int((x2 - x1) * margin), int((y2 - y1) * margin)
+    x1, y1 = max(x1 - pad_x, 0), max(y1 - pad_y, 0)
+    x2, y2 = min(x2 + pad_x, frame.shape[1]), min(y2 + pad_y, frame.shape[0])
+    return frame[y1:y2, x1:x2], (x1, y1)
 
 class PunchDetector:
-    def __init__(self):
+    def __init__(self, frame_skip=2):
         # YOLO 초기화 (person 감지용)
-        self.person_model = YOLO('yolov8n.pt')
-        self.person_model.classes = [0]  # person class만 사용
-        self.person_model.conf = 0.3     # 신뢰도 임계값 낮춤
-        self.person_model.iou = 0.45
+        self.person_model = create_person_model()
+        self.model_lock = threading.Lock()
         
         # MediaPipe 초기화
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5,
-            model_complexity=1
-        )
         self.mp_drawing = mp.solutions.drawing_utils
         
         # 선수 추적 설정
@@ -41,9 +89,11 @@ class PunchDetector:
                 'last_position': None
             }
         }
+        # 선수별 포즈 모델 (크롭 단위로 추적 상태 유지)
+        self.poses = {player_id: create_pose_model() for player_id in self.players}
         
-        # 성능 최적화 설정
-        self.frame_skip = 2
+        # 성능 최적화 설정 (frame_skip번째 프레임만 분석, 입력 FPS를 밖에서 조절하면 1)
+        self.frame_skip = frame_skip
         self.process_count = 0
         self.prev_results = None
         
@@ -53,230 +103,320 @@ class PunchDetector:
         self.cross_angle_min = 150
         self.hook_angle_min = 70
         self.hook_angle_max = 120
+        # 속도/팔 뻗음은 선수 몸통 길이 단위 (카메라와의 거리와 무관)
+        self.hook_velocity_min = 0.25
+        self.hook_extension_min = 0.6
+        self.hit_resolver = HitResolver()
         
-        # 비동기 처리를 위한 큐 초기화
+        # 분석 대기 프레임 큐 (main.py의 수신 루프 -> FramePipeline)
         self.processing_queue = asyncio.Queue(maxsize=4)
-        self.result_queue = asyncio.Queue(maxsize=4)
+        
+        # 펀치/타격 이벤트 수신자 (event -> None)
+        self.event_handlers = []
+        # 현재 라운드 번호 (이벤트 로그/라운드 집계 기준, start_round로 변경)
+        self.round = 1
+        
+        # 선수별 직전 손목 위치와 시각 (player_id -> (손목 (2,), 시각)), 속도/이동 경로 계산용
+        self.motion = {}
+        
+        # 하이라이트 클립용 최근 프레임 버퍼 (FrameRingBuffer)
+        self.frame_buffer = None
+        
+        # 현재 프레임의 촬영 시각과 단계별 처리 시간 (초)
+        self.frame_time = 0
+        self.stage_timings = {}
 
-    async def initialize_queues(self):
-        """큐 초기화"""
-        self.processing_queue = asyncio.Queue(maxsize=4)
-        self.result_queue = asyncio.Queue(maxsize=4)
+    def emit_event(self, event):
+        """감지된 이벤트를 등록된 핸들러에 전달"""
+        for handler in self.event_handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Error in event handler: {e}")
 
-    async def process_frame_async(self, frame):
-        try:
-            # 프레임 스킵
-            self.process_count += 1
-            if self.process_count % self.frame_skip != 0:
-                return self.prev_results
-            
-            # 프레임 전처리
-            frame = cv2.resize(frame, (640, 480))
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # YOLO 감지
-            person_results = await asyncio.get_event_loop().run_in_executor(
-                None, self.person_model, frame
-            )
-            
-            # 사람 감지 결과 처리
-            person_boxes = []
-            for box in person_results[0].boxes:
-                if box.cls[0] == 0:  # person class
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf[0])
-                    center_x = (x1 + x2) / 2
-                    
-                    person_boxes.append({
-                        'bbox': (x1, y1, x2, y2),
-                        'center_x': center_x,
-                        'conf': conf
-                    })
-            
-            # MediaPipe 포즈 추정
-            pose_results = await asyncio.get_event_loop().run_in_executor(
-                None, self.pose.process, frame_rgb
-            )
-            
-            annotated_frame = frame.copy()
-            stats = {
-                'player1': {
-                    'hook': self.players['player1']['punches']['hook'],
-                    'hits': self.players['player1']['hits'].copy()
-                },
-                'player2': {
-                    'hook': self.players['player2']['punches']['hook'],
-                    'hits': self.players['player2']['hits'].copy()
+    def reset_motion_state(self):
+        """카메라 전환 시 이전 시점 기준의 손목 속도/결과 초기화"""
+        # 읽는 쪽이 예전 dict를 들고 있어도 안전하도록 새 dict로 교체
+        self.motion = {}
+        self.prev_results = None
+
+    def state_snapshot(self):
+        """
+        발행용 선수 상태 (프레임마다 새 dict)
+        이후 프레임에서 바뀌는 펀치/타격 dict만 복사하므로 저장소가 그대로 보관해도 안전하다.
+        """
+        return {
+            player_id: {**player, 'punches': dict(player['punches']), 'hits': dict(player['hits'])}
+            for player_id, player in self.players.items()
+        }
+
+    def capture_state(self):
+        """
+        입력 캡처 시작 시점의 감지 상태 (JSON 직렬화 가능, 재생 시 restore_state로 복원)
+        MediaPipe 내부 추적 상태는 포함되지 않는다.
+        """
+        motion = {player_id: {'wrist': wrist.tolist(), 'time': wrist_time}
+                  for player_id, (wrist, wrist_time) in self.motion.items()}
+        return {
+            'frame_skip': self.frame_skip,
+            'process_count': self.process_count,
+            'round': self.round,
+            'players': {
+                player_id: {
+                    'punches': dict(player['punches']),
+                    'hits': dict(player['hits']),
+                    'last_punch_time': player['last_punch_time']
                 }
+                for player_id, player in self.players.items()
+            },
+            'motion': motion
+        }
+
+    def restore_state(self, state):
+        """capture_state 결과 복원"""
+        self.frame_skip = state['frame_skip']
+        self.process_count = state['process_count']
+        self.round = state['round']
+        for player_id, player in state['players'].items():
+            self.players[player_id].update(
+                punches=dict(player['punches']),
+                hits=dict(player['hits']),
+                last_punch_time=player['last_punch_time']
+            )
+        self.prev_results = None
+        self.motion = {
+            player_id: (np.array(motion['wrist'], dtype=np.float32), motion['time'])
+            for player_id, motion in state['motion'].items()
+        }
+
+    def start_round(self, round_no=None):
+        """라운드 경계: 이후 이벤트는 새 라운드로 기록 (round_no가 없으면 다음 라운드)"""
+        self.round = round_no if round_no is not None else self.round + 1
+
+    # 프레임 한 장의 처리 단계 (순서대로 실행, 실행기 배치는 pipeline.FramePipeline)
+    STAGES = ('ingest', 'detect', 'pose', 'track', 'classify', 'publish')
+
+    def stage_ingest(self, ctx):
+        """프레임 스킵, 밝기/대비 보정, 크기 조정"""
+        # 프레임 스킵
+        self.process_count += 1
+        if self.process_count % self.frame_skip != 0:
+            ctx['skip'] = True
+            return ctx
+        
+        ctx['timestamp'] = ctx.get('timestamp') or time.time()
+        self.frame_time = ctx['timestamp']
+        
+        # 프레임 전처리
+        frame = cv2.resize(preprocess_frame(ctx['frame']), (640, 480))
+        ctx['frame'] = frame
+        ctx['frame_rgb'] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return ctx
+
+    def stage_detect(self, ctx):
+        """YOLO 사람 감지"""
+        ctx['person_boxes'] = self.detect_persons(ctx['frame'])
+        return ctx
+
+    def prepare_pose(self, ctx):
+        """선수 구분 후 선수별 포즈 입력 (선수, 크롭, 크롭 좌상단) 목록"""
+        ctx['assignments'] = assign_players(ctx['person_boxes'])
+        ctx['poses'] = {}
+        inputs = []
+        for player_id, box in ctx['assignments']:
+            crop, offset = crop_player(ctx['frame_rgb'], box['bbox'])
+            if crop.size:
+                inputs.append((player_id, crop, offset))
+        return inputs
+
+    def stage_pose(self, ctx):
+        """선수별 크롭에서 MediaPipe 포즈 추정 (프레임 픽셀 좌표 배열)"""
+        for player_id, crop, offset in self.prepare_pose(ctx):
+            results = self.poses[player_id].process(crop)
+            ctx['poses'][player_id] = pose_to_array(results.pose_landmarks, offset,
+                                                    (crop.shape[1], crop.shape[0]))
+        return ctx
+
+    def stage_track(self, ctx):
+        """선수 가시성 기록 및 선수 위치 갱신"""
+        person_boxes = ctx['person_boxes']
+        poses = ctx['poses']
+        
+        # 선수 가시성 / 포즈 신뢰도 기록 (골격을 못 찾은 선수는 0)
+        top_confs = sorted((box['conf'] for box in person_boxes), reverse=True)[:2]
+        ctx['quality'] = {
+            'persons': len(person_boxes),
+            'person_conf': sum(top_confs) / 2,
+            'pose_visibility': sum(float(pose[:, 2].mean()) for pose in poses.values() if pose is not None) / 2
+        }
+        
+        for player_id, box in ctx['assignments']:
+            # 선수 위치 업데이트
+            self.players[player_id]['last_position'] = box['center_x']
+        return ctx
+
+    def stage_classify(self, ctx):
+        """선수별 펀치 동작 감지 후 상대 골격 기준으로 타격 판정 (한 번에)"""
+        poses = ctx['poses']
+        attacks = []
+        for player_id, box in ctx['assignments']:
+            pose = poses.get(player_id)
+            if pose is None:
+                continue
+            attack = self.analyze_punch(pose, player_id, ctx['timestamp'])
+            if attack:
+                opponent = poses.get('player2' if player_id == 'player1' else 'player1')
+                attack['regions'] = self.hit_resolver.target_regions(opponent) if opponent is not None else None
+                attacks.append((player_id, box, attack))
+        
+        ctx['punches'] = []
+        hits = self.hit_resolver.resolve([attack for _, _, attack in attacks])
+        for (player_id, box, attack), hit in zip(attacks, hits):
+            ctx['punches'].append((player_id, box, self.register_punch(player_id, attack, hit, ctx['timestamp'])))
+        return ctx
+
+    def stage_publish(self, ctx):
+        """이벤트 전달, 시각화, 통계 갱신 (이벤트 루프에서 실행)"""
+        frame = ctx['frame']
+        poses = ctx['poses']
+        annotated_frame = frame.copy()
+        stats = {
+            player_id: {
+                'hook': player['punches']['hook'],
+                'hits': player['hits'].copy()
             }
+            for player_id, player in self.players.items()
+        }
+        
+        # 바운딩 박스 그리기
+        for player_id, box in ctx['assignments']:
+            x1, y1, x2, y2 = box['bbox']
+            color = (0, 255, 0) if player_id == 'player1' else (0, 0, 255)
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(annotated_frame, f"{player_id}", (x1, y1-10),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        
+        for player_id, box, punch_info in ctx['punches']:
+            self.emit_event({
+                'timestamp': ctx['timestamp'],
+                'kind': 'punch',
+                'player': player_id,
+                'punch': punch_info['type'],
+                'target': punch_info['hit'],
+                'distance': float(punch_info['distance']),
+                'confidence': punch_info['confidence'],
+                'round': self.round
+            })
+            
+            # 펀치 효과 표시
+            self.draw_punch_effect(annotated_frame, poses[player_id], punch_info, player_id)
+        
+        # 포즈 시각화
+        for pose in poses.values():
+            if pose is not None:
+                self.draw_pose(annotated_frame, pose)
+        
+        # 통계 표시 업데이트
+        for i, (player_id, player_stats) in enumerate(stats.items()):
+            hits = player_stats['hits']
+            total_hits = hits['face'] + hits['body']
             
-            if pose_results.pose_landmarks and len(person_boxes) >= 2:
-                # 왼쪽/오른쪽 위치 기반으로 선수 구분
-                sorted_boxes = sorted(person_boxes, key=lambda x: x['center_x'])
-                
-                # 선수별 처리
-                for i, box in enumerate(sorted_boxes[:2]):  # 최대 2명만 처리
-                    player_id = 'player1' if i == 0 else 'player2'
-                    x1, y1, x2, y2 = box['bbox']
-                    
-                    # 선수 위치 업데이트
-                    self.players[player_id]['last_position'] = box['center_x']
-                    
-                    # 바운딩 박스 그리기
-                    color = (0, 255, 0) if player_id == 'player1' else (0, 0, 255)
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(annotated_frame, f"{player_id}", (x1, y1-10),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                    
-                    # 펀치 감지
-                    punch_info = await asyncio.get_event_loop().run_in_executor(
-                        None, self.analyze_punch, pose_results.pose_landmarks.landmark,
-                        player_id
-                    )
-                    
-                    if punch_info:
-                        # 펀치 효과 표시
-                        self.draw_punch_effect(annotated_frame, 
-                                            pose_results.pose_landmarks.landmark,
-                                            punch_info, player_id)
-                        
-                        # 통계 업데이트
-                        stats[player_id]['hook'] = self.players[player_id]['punches']['hook']
-                        stats[player_id]['hits'] = self.players[player_id]['hits'].copy()
-                
-                # 포즈 시각화
-                self.mp_drawing.draw_landmarks(
-                    annotated_frame,
-                    pose_results.pose_landmarks,
-                    self.mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=self.mp_drawing.DrawingSpec(color=(245,117,66), 
-                                                                    thickness=2, 
-                                                                    circle_radius=2),
-                    connection_drawing_spec=self.mp_drawing.DrawingSpec(color=(245,66,230), 
-                                                                      thickness=2)
-                )
-            
-            # 통계 표시 업데이트
-            for i, (player_id, player_stats) in enumerate(stats.items()):
-                hits = player_stats['hits']
-                total_hits = hits['face'] + hits['body']
-                
-                # Hook 카운트
-                text1 = f"{player_id}: Hook={player_stats['hook']}"
-                cv2.putText(annotated_frame, text1, (10, 30 + i * 60),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7,
-                           (0, 255, 0) if player_id == 'player1' else (0, 0, 255), 2)
-                
-                # Hit 카운트
-                text2 = f"Hits - Face: {hits['face']}, Body: {hits['body']} (Total: {total_hits})"
-                cv2.putText(annotated_frame, text2, (10, 55 + i * 60),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7,
-                           (0, 255, 0) if player_id == 'player1' else (0, 0, 255), 2)
-            
-            self.prev_results = {
-                'visualization': annotated_frame,
-                'stats': stats
-            }
-            return self.prev_results
-            
-        except Exception as e:
-            print(f"Error in process_frame_async: {e}")
-            return self.prev_results
+            # Hook 카운트
+            text1 = f"{player_id}: Hook={player_stats['hook']}"
+            cv2.putText(annotated_frame, text1, (10, 30 + i * 60),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7,
+                       (0, 255, 0) if player_id == 'player1' else (0, 0, 255), 2)
+            
+            # Hit 카운트
+            text2 = f"Hits - Face: {hits['face']}, Body: {hits['body']} (Total: {total_hits})"
+            cv2.putText(annotated_frame, text2, (10, 55 + i * 60),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7,
+                       (0, 255, 0) if player_id == 'player1' else (0, 0, 255), 2)
+        
+        self.prev_results = {
+            'visualization': annotated_frame,
+            'stats': stats
+        }
+        ctx['result'] = self.prev_results
+        return ctx
+
+    def detect_persons(self, frame):
+        """YOLO 사람 감지 (여러 스레드에서 호출되므로 모델 사용은 직렬화)"""
+        with self.model_lock:
+            person_results = self.person_model(frame)
+        return parse_person_boxes(person_results)
 
-    def analyze_punch(self, landmarks, player_id):
-        """펀치 동작 감지 및 타격 판정"""
+    def analyze_punch(self, pose, player_id, timestamp=None):
+        """
+        펀치(Hook) 동작 감지 (선수 자신의 골격만 사용)
+        감지되면 이전 프레임 ~ 현재 프레임 손목 이동 경로를 반환하고, 타격 판정은 HitResolver가 수행
+        """
         try:
-            current_time = time.time()
-            if current_time - self.players[player_id]['last_punch_time'] < self.cooldown_time:
-                return None
-            
+            current_time = timestamp or self.frame_time or time.time()
             is_left = player_id == 'player1'
-            opponent_id = 'player2' if is_left else 'player1'
             
-            # 주요 관절 좌표 추출
-            shoulder = landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value if is_left else self.mp_pose.PoseLandmark.RIGHT_SHOULDER.value]
-            elbow = landmarks[self.mp_pose.PoseLandmark.LEFT_ELBOW.value if is_left else self.mp_pose.PoseLandmark.RIGHT_ELBOW.value]
-            wrist = landmarks[self.mp_pose.PoseLandmark.LEFT_WRIST.value if is_left else self.mp_pose.PoseLandmark.RIGHT_WRIST.value]
+            # 주요 관절 좌표 추출 (픽셀)
+            shoulder_pos = pose[LEFT_SHOULDER if is_left else RIGHT_SHOULDER, :2]
+            elbow_pos = pose[LEFT_ELBOW if is_left else RIGHT_ELBOW, :2]
+            wrist = pose[LEFT_WRIST if is_left else RIGHT_WRIST]
+            wrist_pos = wrist[:2].copy()
+            scale = body_scale(pose)
             
-            # 상대방의 얼굴과 몸통 부위 좌표
-            opponent_nose = landmarks[self.mp_pose.PoseLandmark.NOSE.value]
-            opponent_shoulder = landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER.value if is_left else self.mp_pose.PoseLandmark.LEFT_SHOULDER.value]
-            opponent_hip = landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP.value if is_left else self.mp_pose.PoseLandmark.LEFT_HIP.value]
+            prev_wrist, prev_time = self.motion.get(player_id, (None, None))
+            if prev_time is not None and not 0 < current_time - prev_time <= MAX_SWEEP_DT:
+                prev_wrist = prev_time = None
+            self.motion[player_id] = (wrist_pos, current_time)
             
-            # 2D 좌표로 변환
-            wrist_pos = np.array([wrist.x, wrist.y])
-            shoulder_pos = np.array([shoulder.x, shoulder.y])
-            elbow_pos = np.array([elbow.x, elbow.y])
-            
-            opponent_nose_pos = np.array([opponent_nose.x, opponent_nose.y])
-            opponent_shoulder_pos = np.array([opponent_shoulder.x, opponent_shoulder.y])
-            opponent_hip_pos = np.array([opponent_hip.x, opponent_hip.y])
-            
-            # 타격 판정을 위한 거리 계산
-            hit_distances = {
-                'face': np.linalg.norm(wrist_pos - opponent_nose_pos),
-                'body': min(
-                    np.linalg.norm(wrist_pos - opponent_shoulder_pos),
-                    np.linalg.norm(wrist_pos - opponent_hip_pos)
-                )
-            }
+            if current_time - self.players[player_id]['last_punch_time'] < self.cooldown_time:
+                return None
             
-            # Hook 동작 감지 로직
-            arm_extension = np.linalg.norm(wrist_pos - shoulder_pos)
+            # Hook 동작 감지 로직 (몸통 길이 단위)
+            arm_extension = np.linalg.norm(wrist_pos - shoulder_pos) / scale
             elbow_angle = self.calculate_angle(shoulder_pos, elbow_pos, wrist_pos)
             
             velocity = 0
-            if hasattr(self, f'prev_wrist_{player_id}'):
-                prev_wrist = getattr(self, f'prev_wrist_{player_id}')
-                dt = current_time - getattr(self, f'prev_time_{player_id}')
-                if dt > 0:
-                    velocity = np.linalg.norm(wrist_pos - prev_wrist) / dt
-            
-            setattr(self, f'prev_wrist_{player_id}', wrist_pos)
-            setattr(self, f'prev_time_{player_id}', current_time)
+            if prev_wrist is not None:
+                velocity = np.linalg.norm(wrist_pos - prev_wrist) / scale / (current_time - prev_time)
             
             # Hook 판정
             is_hook = (
-                velocity > 0.05 and
-                arm_extension > 0.15 * 0.8 and
+                velocity > self.hook_velocity_min and
+                arm_extension > self.hook_extension_min and
                 60 < elbow_angle < 120
             )
             
-            # 타격 판정 (거리 임계값 조정 필요)
-            HIT_THRESHOLD = 0.2  # 타격 거리 임계값
-            hit_target = None
-            if is_hook:
-                if hit_distances['face'] < HIT_THRESHOLD:
-                    hit_target = 'face'
-                elif hit_distances['body'] < HIT_THRESHOLD:
-                    hit_target = 'body'
-            
-            # 디버그 정보
-            print(f"Player {player_id} - Vel: {velocity:.3f}, Ext: {arm_extension:.3f}, "
-                  f"Angle: {elbow_angle:.1f}, Hook: {is_hook}, "
-                  f"Hit Face: {hit_distances['face']:.3f}, Hit Body: {hit_distances['body']:.3f}")
-            
-            if is_hook:
-                self.players[player_id]['last_punch_time'] = current_time
-                self.players[player_id]['punches']['hook'] += 1
-                
-                # Hit 카운트 증가
-                if hit_target:
-                    self.players[player_id]['hits'][hit_target] += 1
-                
-                # 타격 정보 반환
-                return {
-                    'type': 'hook',
-                    'hit': hit_target,
-                    'distance': min(hit_distances.values())
-                }
-            
-            return None
+            if not is_hook:
+                return None
+            return {
+                'type': 'hook',
+                'start': prev_wrist if prev_wrist is not None else wrist_pos,
+                'end': wrist_pos,
+                'scale': scale,
+                'visibility': float(wrist[2])
+            }
             
         except Exception as e:
             print(f"Error in analyze_punch: {e}")
             return None
 
+    def register_punch(self, player_id, attack, hit, timestamp=None):
+        """펀치/타격 카운트 증가 후 타격 정보 반환"""
+        player = self.players[player_id]
+        player['last_punch_time'] = timestamp or self.frame_time or time.time()
+        player['punches'][attack['type']] += 1
+        
+        # Hit 카운트 증가
+        if hit['hit']:
+            player['hits'][hit['hit']] += 1
+        
+        return {
+            'type': attack['type'],
+            'hit': hit['hit'],
+            'distance': hit['distance'],
+            # 타격이면 타격 판정 신뢰도, 아니면 펀치 감지 신뢰도 (손목 가시성)
+            'confidence': hit['confidence'] if hit['hit'] else attack['visibility']
+        }
+
     def calculate_angle(self, a, b, c):
         """세 점 사이의 각도 계산"""
         try:
@@ -288,16 +428,19 @@ class PunchDetector:
         except:
             return 0
 
-    def draw_punch_effect(self, frame, landmarks, punch_info, player_id):
+    def draw_pose(self, frame, pose):
+        """프레임 픽셀 좌표 골격 그리기"""
+        points = pose[:, :2].astype(int)
+        for start, end in self.mp_pose.POSE_CONNECTIONS:
+            cv2.line(frame, tuple(points[start]), tuple(points[end]), (245, 66, 230), 2)
+        for x, y in points:
+            cv2.circle(frame, (x, y), 2, (245, 117, 66), 2)
+
+    def draw_punch_effect(self, frame, pose, punch_info, player_id):
         """펀치 효과와 타격 시각화"""
         try:
             is_left = player_id == 'player1'
-            wrist_idx = self.mp_pose.PoseLandmark.LEFT_WRIST.value if is_left else self.mp_pose.PoseLandmark.RIGHT_WRIST.value
-            wrist = landmarks[wrist_idx]
-            
-            # 화면 좌표로 변환
-            x = int(wrist.x * frame.shape[1])
-            y = int(wrist.y * frame.shape[0])
+            x, y = pose[LEFT_WRIST if is_left else RIGHT_WRIST, :2].astype(int)
             
             # 펀치 효과
             color = (255, 0, 0)  # 기본 파란색
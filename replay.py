@@ -0,0 +1,133 @@
+"""
+캡처 파일을 분석 파이프라인에 다시 입력해 처리 시간과 결과를 재현
+감지기는 캡처 시작 시점의 상태(펀치/타격 수, 라운드, 프레임 스킵, 손목 위치)에서 시작한다.
+MediaPipe 내부 추적 상태는 저장되지 않으므로 처음 몇 프레임의 포즈는 운영 중 결과와 다를 수 있고,
+파이프라인 안에 있던 프레임만큼 상태 시점이 어긋날 수 있어 결과는 운영과 거의 같지만 항상 동일하지는 않다.
+
+$ python replay.py captures/ring1_20250101-120000.fccap --speed max
+$ python replay.py captures/ring1_20250101-120000.fccap --speed original --output build_a.json
+$ PIPELINE_CONFIG=pipeline.json python replay.py captures/ring1_20250101-120000.fccap --output build_b.json
+"""
+import argparse
+import asyncio
+import time
+import numpy as np
+from capture import CaptureReader
+from pipeline import FramePipeline, load_pipeline_config
+from punch_detector import PunchDetector
+from utils import i420_to_bgr, save_results
+
+
+def summarize(timings):
+    """단계별 처리 시간 통계 (ms)"""
+    stages = {}
+    for frame_timings in timings.values():
+        for stage, seconds in frame_timings.items():
+            stages.setdefault(stage, []).append(seconds * 1000)
+    return {
+        stage: {
+            'frames': len(values),
+            'mean': round(float(np.mean(values)), 2),
+            'p50': round(float(np.percentile(values, 50)), 2),
+            'p95': round(float(np.percentile(values, 95)), 2),
+            'max': round(float(np.max(values)), 2)
+        }
+        for stage, values in stages.items()
+    }
+
+
+async def replay(path: str, speed: str = 'max'):
+    reader = CaptureReader(path)
+    detector = PunchDetector()
+    initial_state = reader.initial_state()
+    if initial_state is not None:
+        detector.restore_state(initial_state)
+    events = []
+    detector.event_handlers.append(events.append)
+
+    timings = {}
+
+    def record(ctx):
+        timings[ctx['capture_seq']] = {'convert': ctx['convert'], **ctx['timings']}
+
+    # 운영과 같은 파이프라인 설정(PIPELINE_CONFIG)으로 실행
+    config = load_pipeline_config()
+    pipeline = FramePipeline(detector, config, on_result=record, name='replay')
+    pipeline.start()
+
+    first_timestamp = None
+    wall_start = time.perf_counter()
+
+    for seq, timestamp, (width, height, data) in reader.frames():
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        if speed == 'original':
+            # 원래 촬영 간격에 맞춰 입력
+            delay = (timestamp - first_timestamp) - (time.perf_counter() - wall_start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        stage_start = time.perf_counter()
+        frame = i420_to_bgr(data, width, height)
+        convert_time = time.perf_counter() - stage_start
+
+        # 촬영 시각을 그대로 넘겨 속도/쿨다운 판정을 원본과 동일하게 유지
+        await pipeline.submit({'frame': frame, 'timestamp': timestamp, 'capture_seq': seq,
+                               'convert': convert_time})
+
+    await pipeline.drain()
+    elapsed = time.perf_counter() - wall_start
+    pipeline_stats = pipeline.stats()
+    await pipeline.stop()
+    return {
+        'capture': path,
+        'speed': speed,
+        'pipeline': config,
+        'frames': pipeline_stats['submitted'],
+        'elapsed': round(elapsed, 3),
+        'fps': round(pipeline_stats['submitted'] / elapsed, 2) if elapsed > 0 else 0.0,
+        'players': {
+            player_id: {'punches': player['punches'], 'hits': player['hits']}
+            for player_id, player in detector.players.items()
+        },
+        'events': len(events),
+        'replay_timings': summarize(timings),
+        'recorded_timings': summarize(reader.timings()),
+        'pipeline_stats': pipeline_stats
+    }
+
+
+def print_report(result):
+    print(f"{result['capture']} ({result['speed']}): {result['frames']} frames in {result['elapsed']}s "
+          f"({result['fps']} fps), {result['events']} events")
+    for player_id, stats in result['players'].items():
+        print(f"  {player_id}: punches={stats['punches']} hits={stats['hits']}")
+
+    print(f"  {'stage':<12}{'recorded p50':>14}{'p95':>9}{'replay p50':>13}{'p95':>9}")
+    recorded = result['recorded_timings']
+    for stage, stats in result['replay_timings'].items():
+        before = recorded.get(stage, {})
+        print(f"  {stage:<12}{before.get('p50', '-'):>14}{before.get('p95', '-'):>9}"
+              f"{stats['p50']:>13}{stats['p95']:>9}")
+
+    print(f"  {'stage':<12}{'executor':>10}{'workers':>9}{'fps':>9}{'avg ms':>9}{'wait ms':>9}")
+    for stage, stats in result['pipeline_stats']['stages'].items():
+        print(f"  {stage:<12}{stats['executor']:>10}{stats['workers']:>9}{stats['fps']:>9}"
+              f"{stats['avg_ms']:>9}{stats['avg_wait_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture')
+    parser.add_argument('--speed', choices=['original', 'max'], default='max')
+    parser.add_argument('--output', help='결과 JSON 저장 경로 (빌드 간 비교용)')
+    args = parser.parse_args()
+
+    result = asyncio.run(replay(args.capture, args.speed))
+    print_report(result)
+    if args.output:
+        save_results(result, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ROLLUP_DB = os.getenv("ROLLUP_DB", "rollups.sqlite3")
+
+# 해상도별 버킷 크기 (초). round는 라운드 번호 단위
+RESOLUTIONS = {'second': 1, 'minute': 60}
+# 초 단위 버킷 보관 기간 (초). 더 오래된 구간은 분 단위로만 조회
+SECOND_RETENTION = int(os.getenv("ROLLUP_SECOND_RETENTION", 86400))
+# 보관 기간이 지난 버킷 삭제 간격 (초)
+COMPACT_INTERVAL = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    room TEXT NOT NULL,
+    session INTEGER NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    punches INTEGER NOT NULL DEFAULT 0,
+    hits_face INTEGER NOT NULL DEFAULT 0,
+    hits_body INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (room, resolution, bucket, session, player)
+) WITHOUT ROWID
+"""
+
+UPSERT = """
+INSERT INTO rollups (room, session, resolution, bucket, player, punches, hits_face, hits_body)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (room, resolution, bucket, session, player) DO UPDATE SET
+    punches = punches + excluded.punches,
+    hits_face = hits_face + excluded.hits_face,
+    hits_body = hits_body + excluded.hits_body
+"""
+
+
+class RollupStore:
+    """로컬 SQLite 기반 집계 저장소"""
+
+    def __init__(self, path: str = ROLLUP_DB, second_retention: int = SECOND_RETENTION):
+        self.path = path
+        self.second_retention = second_retention
+        self.last_compact = 0.0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def write(self, rows: List[tuple]):
+        with self.lock, self.conn:
+            self.conn.executemany(UPSERT, rows)
+        if time.time() - self.last_compact >= COMPACT_INTERVAL:
+            # 기록은 이미 커밋됐으므로 삭제 실패가 기록 실패(재시도)로 이어지지 않게 함
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                print(f"Error in rollup compaction: {e}")
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """보관 기간이 지난 초 단위 버킷 삭제 (분/라운드 버킷은 유지), 삭제한 행 수 반환"""
+        now = now if now is not None else time.time()
+        self.last_compact = now
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM rollups WHERE resolution = 'second' AND bucket < ?",
+                (int(now - self.second_retention),))
+        return cursor.rowcount
+
+    def _fetch(self, sql: str, params) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def sessions(self, room_name: str) -> List[Dict]:
+        """방의 세션 목록 (시작/종료 시각)"""
+        cursor = self._fetch(
+            "SELECT session, MIN(bucket), MAX(bucket) FROM rollups "
+            "WHERE room = ? AND resolution = 'minute' GROUP BY session ORDER BY session",
+            (room_name,))
+        return [{'session': s, 'start': start, 'end': end + 60} for s, start, end in cursor]
+
+    def query(self, room_name: str, start: float, end: float, max_points: int = 300,
+              session: Optional[int] = None) -> Dict:
+        """[start, end) 구간의 시계열을 max_points 이하로 다운샘플링해 반환
+
+        조회 비용은 이벤트 수가 아니라 읽는 버킷 수에 비례한다.
+        """
+        span = max(end - start, 1)
+        step = max(1, math.ceil(span / max_points))
+        resolution = 'second'
+        # 초 단위 버킷이 삭제된 구간을 포함하면 분 단위로 조회
+        if step >= RESOLUTIONS['minute'] or start < time.time() - self.second_retention:
+            resolution = 'minute'
+            step = math.ceil(step / 60) * 60
+
+        # 다운샘플 구간은 start 기준으로 정렬
+        origin = int(start) // RESOLUTIONS[resolution] * RESOLUTIONS[resolution]
+        sql = ("SELECT ? + ((bucket - ?) / ?) * ? AS t, player, SUM(punches), SUM(hits_face), SUM(hits_body) "
+               "FROM rollups WHERE room = ? AND resolution = ? AND bucket >= ? AND bucket < ?")
+        params = [origin, origin, step, step, room_name, resolution, origin, int(math.ceil(end))]
+        if session is not None:
+            sql += " AND session = ?"
+            params.append(session)
+        sql += " GROUP BY t, player ORDER BY t"
+
+        series = defaultdict(list)
+        for t, player, punches, face, body in self._fetch(sql, params):
+            series[player].append(_point(t, punches, face, body, step))
+        return {'resolution': resolution, 'step': step, 'series': dict(series)}
+
+    def query_rounds(self, room_name: str, session: int) -> Dict:
+        """세션의 라운드별 집계"""
+        cursor = self._fetch(
+            "SELECT bucket, player, punches, hits_face, hits_body FROM rollups "
+            "WHERE room = ? AND resolution = 'round' AND session = ? ORDER BY bucket",
+            (room_name, session))
+        series = defaultdict(list)
+        for round_no, player, punches, face, body in cursor:
+            point = _point(round_no, punches, face, body)
+            point['round'] = point.pop('t')
+            series[player].append(point)
+        return {'resolution': 'round', 'series': dict(series)}
+
+    def close(self):
+        self.conn.close()
+
+
+def _point(t, punches, face, body, step=None):
+    hits = face + body
+    point = {
+        't': t,
+        'punches': punches,
+        'hits': {'face': face, 'body': body},
+        'hit_rate': round(hits / punches, 3) if punches else 0.0
+    }
+    if step:
+        point['punches_per_minute'] = round(punches * 60 / step, 2)
+    return point
+
+
+class RoomRollup:
+    """이벤트를 초/분/라운드 버킷으로 증분 집계하고 주기적으로 저장소에 반영"""
+
+    def __init__(self, room_name: str, store: RollupStore, session: Optional[int] = None,
+                 flush_interval=1.0):
+        self.room_name = room_name
+        self.store = store
+        self.session = session if session is not None else int(time.time())
+        self.flush_interval = flush_interval
+        # (resolution, bucket, player) -> [punches, hits_face, hits_body]
+        self.pending = defaultdict(lambda: [0, 0, 0])
+        self.task = None
+
+    def add(self, event: Dict):
+        """이벤트 한 건을 각 해상도 버킷에 누적"""
+        if event.get('kind', 'punch') != 'punch':
+            return
+        player = event.get('player')
+        timestamp = event.get('timestamp', time.time())
+        target = event.get('target')
+
+        keys = [(name, int(timestamp // size) * size, player) for name, size in RESOLUTIONS.items()]
+        keys.append(('round', event['round'], player))
+        for key in keys:
+            counts = self.pending[key]
+            counts[0] += 1
+            if target == 'face':
+                counts[1] += 1
+            elif target == 'body':
+                counts[2] += 1
+
+    def __call__(self, event: Dict):
+        self.add(event)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._flush_loop())
+        return self.task
+
+    async def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, defaultdict(lambda: [0, 0, 0])
+        rows = [(self.room_name, self.session, resolution, bucket, player, *counts)
+                for (resolution, bucket, player), counts in pending.items()]
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self.store.write, rows)
+        except Exception as e:
+            print(f"Error in rollup flush: {e}")
+            # 기록하지 못한 증분은 다음 flush에서 다시 시도 (트랜잭션이라 일부만 반영되지 않음)
+            for key, counts in pending.items():
+                merged = self.pending[key]
+                for i, count in enumerate(counts):
+                    merged[i] += count
+
+    async def _flush_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
@@ -0,0 +1,283 @@
+import asyncio
+import heapq
+import itertools
+import json
+from typing import Dict, Iterable, Optional
+
+# 체육관 전체 집계 갱신 최소 간격
+GYM_INTERVAL = 0.4
+# 놓친 알림 보정을 위한 전체 동기화 간격
+RESYNC_INTERVAL = 5.0
+TOP_HITTERS = 5
+
+# 메시지 버전 (프로세스 안에서 재사용되지 않는 증가값)
+_message_versions = itertools.count(1)
+
+
+def get_nested(d, keys, default=None):
+    """중첩 딕셔너리 접근 (없으면 default 반환)"""
+    for k in keys:
+        if not isinstance(d, dict) or k not in d:
+            return default
+        d = d[k]
+    return d
+
+
+def has_significant_change(old_data: dict, new_data: dict) -> bool:
+    """
+    old_data와 new_data에서 player1/player2의 비교
+    - player1.hits.face, player2.hits.face
+    - player1.hits.body, player2.hits.body
+    - player1.punches.hook, player2.punches.hook
+    """
+    fields_to_check = [
+        ["player1", "hits", "face"],
+        ["player1", "hits", "body"],
+        ["player1", "punches", "hook"],
+        ["player2", "hits", "face"],
+        ["player2", "hits", "body"],
+        ["player2", "punches", "hook"],
+    ]
+
+    for field_keys in fields_to_check:
+        old_val = get_nested(old_data, field_keys)
+        new_val = get_nested(new_data, field_keys)
+        if old_val != new_val:
+            return True
+
+    return False
+
+
+def player_totals(state: dict) -> Dict:
+    """방 상태에서 선수별 펀치/타격 합계 추출"""
+    totals = {}
+    for player_id, player in state.items():
+        if not isinstance(player, dict) or 'punches' not in player:
+            continue
+        hits = player.get('hits', {})
+        totals[player_id] = {
+            'punches': sum(player['punches'].values()),
+            'face': hits.get('face', 0),
+            'body': hits.get('body', 0)
+        }
+    return totals
+
+
+class Message:
+    """구독자에게 공유되는 메시지 (직렬화 결과를 한 번만 계산해 재사용)"""
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.version = next(_message_versions)
+        self.encoded = {}
+
+    def cached(self, key: str, encode):
+        if key not in self.encoded:
+            self.encoded[key] = encode()
+        return self.encoded[key]
+
+    def json(self) -> str:
+        return self.cached('json', lambda: json.dumps(self.data))
+
+
+class Subscription:
+    """한 클라이언트의 구독 상태
+
+    키(방 이름, 'gym')별로 가장 최근 메시지만 보관하므로 느린 클라이언트는
+    중간 상태를 건너뛰고 최신 상태만 받는다.
+    """
+
+    def __init__(self, rooms: Optional[Iterable[str]] = None):
+        self.rooms = set(rooms) if rooms else None  # None이면 모든 방
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def wants(self, room_name: str) -> bool:
+        return self.rooms is None or room_name in self.rooms
+
+    def push(self, key: str, message: Message):
+        self.pending[key] = message
+        self.ready.set()
+
+    async def next_batch(self):
+        await self.ready.wait()
+        self.ready.clear()
+        batch = list(self.pending.values())
+        self.pending.clear()
+        return batch
+
+
+class RoomHub:
+    """
+    방 상태 변경 알림을 워커당 방별 구독 하나로 받아 구독자에게 분배하고 체육관 전체 집계를 유지
+    클라이언트 수와 관계없이 상태 저장소 부하는 워커 수 × 방 수로 고정되며,
+    놓친 알림은 주기적인 전체 동기화로 보정한다.
+    """
+
+    def __init__(self, backend, gym_interval=GYM_INTERVAL, resync_interval=RESYNC_INTERVAL):
+        self.backend = backend   # state_backend의 RedisStateBackend / LocalStateBackend
+        self.gym_interval = gym_interval
+        self.resync_interval = resync_interval
+        self.subscribers = set()
+        self.task = None
+        self.listener = None
+        self.channels = set()   # 구독 중인 방 이름
+        self.ready = asyncio.Event()   # 첫 동기화 완료 여부
+
+        self.raw = {}           # room -> 마지막으로 받은 원본 (JSON bytes 또는 dict)
+        self.states = {}        # room -> 마지막으로 발행한 상태
+        self.room_totals = {}   # room -> player_totals
+        self.gym = {'rooms': 0, 'total_punches': 0, 'total_hits': {'face': 0, 'body': 0}, 'top_hitters': []}
+        self.gym_message = Message({'type': 'gym', **self.gym})
+        self.gym_dirty = False
+        self.last_gym_update = 0.0
+
+    def subscribe(self, rooms: Optional[Iterable[str]] = None) -> Subscription:
+        """구독 등록 후 현재 스냅샷을 바로 전달"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+        subscription = Subscription(rooms)
+        self.subscribers.add(subscription)
+        for room_name, state in self.states.items():
+            if subscription.wants(room_name):
+                subscription.push(room_name, self.room_message(room_name, state))
+        subscription.push('gym', self.gym_message)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def room_message(self, room_name: str, state: Optional[dict]) -> Message:
+        if state is None:
+            return Message({'type': 'room_closed', 'room': room_name})
+        return Message({'type': 'room', 'room': room_name, 'state': state})
+
+    def _publish(self, room_name: str, message: Message):
+        for subscription in self.subscribers:
+            if subscription.wants(room_name):
+                subscription.push(room_name, message)
+
+    def _apply_totals(self, room_name: str, new_totals: Dict):
+        """방 합계 변화분만 체육관 합계에 반영"""
+        old_totals = self.room_totals.pop(room_name, {})
+        for sign, totals in ((-1, old_totals), (1, new_totals)):
+            for t in totals.values():
+                self.gym['total_punches'] += sign * t['punches']
+                self.gym['total_hits']['face'] += sign * t['face']
+                self.gym['total_hits']['body'] += sign * t['body']
+        if new_totals:
+            self.room_totals[room_name] = new_totals
+
+    def _update_gym(self):
+        entries = (
+            {'room': room_name, 'player': player_id, 'hits': t['face'] + t['body'], 'punches': t['punches']}
+            for room_name, totals in self.room_totals.items()
+            for player_id, t in totals.items()
+        )
+        self.gym['rooms'] = len(self.states)
+        self.gym['top_hitters'] = heapq.nlargest(TOP_HITTERS, entries, key=lambda e: (e['hits'], e['punches']))
+        self.gym_message = Message({'type': 'gym', **self.gym})
+        self.gym_dirty = False
+        for subscription in self.subscribers:
+            subscription.push('gym', self.gym_message)
+
+    def _apply_state(self, room_name: str, raw_data):
+        """방 상태 반영 (의미 있는 변화가 있을 때만 발행)"""
+        if raw_data is None or self.raw.get(room_name) == raw_data:
+            return
+        self.raw[room_name] = raw_data
+        if isinstance(raw_data, dict):
+            # 프로세스 내 저장소는 쓰는 쪽이 새로 만든 dict를 그대로 전달
+            state = raw_data
+        else:
+            try:
+                state = json.loads(raw_data)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return
+
+        previous = self.states.get(room_name)
+        if previous is not None and not has_significant_change(previous, state):
+            return
+        self.states[room_name] = state
+        self._apply_totals(room_name, player_totals(state))
+        self._publish(room_name, self.room_message(room_name, state))
+        self.gym_dirty = True
+
+    def _close_room(self, room_name: str):
+        self.raw.pop(room_name, None)
+        if self.states.pop(room_name, None) is None and room_name not in self.room_totals:
+            return
+        self._apply_totals(room_name, {})
+        self._publish(room_name, self.room_message(room_name, None))
+        self.gym_dirty = True
+
+    async def _subscribe_rooms(self, room_names: Iterable[str]):
+        room_names = set(room_names) - self.channels
+        if room_names:
+            await self.listener.subscribe(room_names)
+            self.channels |= room_names
+
+    async def _unsubscribe_rooms(self, room_names: Iterable[str]):
+        room_names = set(room_names) & self.channels
+        if room_names:
+            await self.listener.unsubscribe(room_names)
+            self.channels -= room_names
+
+    async def resync(self):
+        """활성 방 목록과 상태 전체 동기화 후 방별 채널 구독 갱신"""
+        current = await self.backend.room_states()
+        # 구독 후 상태를 다시 읽어 그 사이의 변경을 놓치지 않음
+        await self._subscribe_rooms(current)
+        if set(current) - set(self.raw):
+            current = await self.backend.room_states()
+        await self._unsubscribe_rooms(self.channels - set(current))
+
+        for room_name in set(self.raw) | set(self.states):
+            if room_name not in current:
+                self._close_room(room_name)
+        for room_name, raw_data in current.items():
+            self._apply_state(room_name, raw_data)
+
+    async def _handle(self, message):
+        room_name = message['room']
+        if message['type'] == 'state':
+            self._apply_state(room_name, message['data'])
+        elif message['event'] == 'opened':
+            await self._subscribe_rooms([room_name])
+            self._apply_state(room_name, await self.backend.room_state(room_name))
+        elif message['event'] == 'closed':
+            await self._unsubscribe_rooms([room_name])
+            self._close_room(room_name)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                self.listener = self.backend.listener()
+                self.channels = set()
+                await self.listener.start()
+                await self.resync()
+                self.ready.set()
+                last_resync = loop.time()
+
+                while True:
+                    message = await self.listener.get_message(timeout=self.gym_interval)
+                    if message is not None:
+                        await self._handle(message)
+
+                    now = loop.time()
+                    if self.gym_dirty and now - self.last_gym_update >= self.gym_interval:
+                        self.last_gym_update = now
+                        self._update_gym()
+                    if now - last_resync >= self.resync_interval:
+                        last_resync = now
+                        await self.resync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in room hub: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                if self.listener is not None:
+                    await self.listener.close()
@@ -0,0 +1,133 @@
+import os
+import time
+from typing import Dict
+
+# 호스트 전체 분석 예산 (분석 파이프라인에 들어가는 초당 프레임 수)
+HOST_INFERENCE_FPS = float(os.getenv("HOST_INFERENCE_FPS", 40))
+# 방별 최대/최소 프레임 수 (최소치는 입장 시 보장)
+ROOM_MAX_FPS = float(os.getenv("ROOM_MAX_FPS", 20))
+ROOM_MIN_FPS = float(os.getenv("ROOM_MIN_FPS", 4))
+DEFAULT_ROOM_PRIORITY = int(os.getenv("DEFAULT_ROOM_PRIORITY", 1))
+# 예산이 부족할 때 방 배분 상한 = 측정된 분석 FPS × DEMAND_HEADROOM (실제로 쓰는 만큼 + 증가 여유)
+DEMAND_HEADROOM = 1.2
+
+
+class InferenceScheduler:
+    """
+    방별 분석 FPS 예산 배분 (분석 파이프라인을 끝까지 통과한 프레임 기준)
+    - 입장한 방은 최소 FPS를 보장받고, 최소 FPS 합이 예산을 넘으면 새 방을 거절
+    - 남은 예산은 우선순위가 높은 방부터, 같은 우선순위 안에서는 균등하게(water-filling) 배분
+    - 과부하 시 우선순위가 낮은 방부터 최소 FPS까지 줄어든다
+    - 배정량을 다 쓰지 못하는 방(카메라 FPS가 낮거나 파이프라인이 밀리는 방)은 측정 FPS 근처로 줄이고
+      남는 예산을 다른 방에 준다 (refresh로 폴링마다 우선순위와 함께 다시 배분)
+    """
+
+    def __init__(self, budget_fps=HOST_INFERENCE_FPS, max_fps=ROOM_MAX_FPS, min_fps=ROOM_MIN_FPS):
+        self.budget_fps = budget_fps
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.rooms = {}
+        self.rejected = {}   # room -> 마지막 거절 시각
+
+    def admit(self, room_name: str, priority: int = DEFAULT_ROOM_PRIORITY) -> bool:
+        """방 입장 요청 (예산이 부족하면 False)"""
+        if room_name in self.rooms:
+            return True
+        if (len(self.rooms) + 1) * self.min_fps > self.budget_fps:
+            self.rejected[room_name] = time.time()
+            return False
+
+        self.rejected.pop(room_name, None)
+        self.rooms[room_name] = {
+            'priority': priority,
+            'allocated_fps': self.min_fps,
+            'observed_fps': 0.0,
+            'measured': False,   # 측정 구간이 한 번이라도 끝났는지
+            'frames': 0,
+            'window_start': time.time()
+        }
+        self.rebalance()
+        return True
+
+    def release(self, room_name: str):
+        if self.rooms.pop(room_name, None) is not None:
+            self.rebalance()
+
+    def demand(self, room: Dict) -> float:
+        """방이 쓸 수 있는 FPS 추정치 (측정 전이면 최대 FPS)"""
+        if not room['measured']:
+            return self.max_fps
+        return min(max(room['observed_fps'] * DEMAND_HEADROOM, self.min_fps), self.max_fps)
+
+    def rebalance(self):
+        """최소 FPS 보장 후 남은 예산을 우선순위 순서로 배분 (먼저 방별 수요까지, 남으면 최대 FPS까지)"""
+        for room in self.rooms.values():
+            room['allocated_fps'] = min(self.min_fps, self.max_fps)
+        remaining = self.budget_fps - sum(room['allocated_fps'] for room in self.rooms.values())
+
+        for cap in (self.demand, lambda room: self.max_fps):
+            for priority in sorted({room['priority'] for room in self.rooms.values()}, reverse=True):
+                tier = [room for room in self.rooms.values() if room['priority'] == priority]
+                # 같은 우선순위 안에서 water-filling
+                while remaining > 1e-6 and tier:
+                    share = remaining / len(tier)
+                    saturated = []
+                    for room in tier:
+                        grant = max(min(share, cap(room) - room['allocated_fps']), 0.0)
+                        room['allocated_fps'] += grant
+                        remaining -= grant
+                        if room['allocated_fps'] >= cap(room) - 1e-6:
+                            saturated.append(room)
+                    if not saturated:
+                        break
+                    tier = [room for room in tier if room not in saturated]
+
+    def refresh(self, priorities: Dict[str, int]):
+        """
+        폴링마다 호출: 방 우선순위(LiveKit metadata)와 측정 FPS를 반영해 다시 배분
+        priorities에 없는 방은 우선순위를 유지한다.
+        """
+        now = time.time()
+        for room_name, room in self.rooms.items():
+            room['priority'] = priorities.get(room_name, room['priority'])
+            # 프레임이 끊긴 방도 측정 FPS가 갱신되도록 구간을 닫음
+            self._close_window(room, now)
+        self.rebalance()
+
+    def interval(self, room_name: str, default: float) -> float:
+        """방의 프레임 처리 간격 (초)"""
+        room = self.rooms.get(room_name)
+        if room is None or room['allocated_fps'] <= 0:
+            return default
+        return 1.0 / room['allocated_fps']
+
+    def record(self, room_name: str):
+        """분석이 끝난 프레임 수 기록 (실제 분석 FPS 측정용)"""
+        room = self.rooms.get(room_name)
+        if room is None:
+            return
+        room['frames'] += 1
+        self._close_window(room, time.time())
+
+    def _close_window(self, room: Dict, now: float):
+        elapsed = now - room['window_start']
+        if elapsed >= 1.0:
+            room['observed_fps'] = room['frames'] / elapsed
+            room['measured'] = True
+            room['frames'] = 0
+            room['window_start'] = now
+
+    def snapshot(self) -> Dict:
+        return {
+            'budget_fps': self.budget_fps,
+            'allocated_fps': round(sum(room['allocated_fps'] for room in self.rooms.values()), 2),
+            'rooms': {
+                room_name: {
+                    'priority': room['priority'],
+                    'allocated_fps': round(room['allocated_fps'], 2),
+                    'observed_fps': round(room['observed_fps'], 2)
+                }
+                for room_name, room in self.rooms.items()
+            },
+            'rejected': sorted(self.rejected)
+        }
@@ -1,87 +1,227 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Request, HTTPException, WebSocket
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import json
-import redis
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from rollup import RollupStore
+from room_hub import RoomHub
+from state_backend import STATE_BACKEND, get_state_backend
+from utils import missing_livekit_config
+from ws_transport import WebSocketClient
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-app = FastAPI()
+# local 모드에서는 분석 루프(main.poll_rooms)를 같은 프로세스/이벤트 루프에서 실행
+run_analysis = STATE_BACKEND == 'local'
+
+@asynccontextmanager
+async def lifespan(app):
+    analysis_task = None
+    if run_analysis:
+        missing = missing_livekit_config()
+        if missing:
+            # 설정이 없으면 분석 없이 API만 제공
+            print(f"Error while starting analysis loop: LiveKit 설정이 없습니다 ({', '.join(missing)})")
+        else:
+            try:
+                import main
+                analysis_task = asyncio.create_task(main.poll_rooms())
+            except Exception as e:
+                print(f"Error while starting analysis loop: {e}")
+    yield
+    if analysis_task is not None:
+        main.shutdown_event.set()
+        try:
+            await asyncio.wait_for(analysis_task, timeout=10)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            print(f"Error in analysis loop: {e}")
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
-    allow_methods=["GET"],
+    allow_methods=["GET", "POST", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
     allow_credentials=True, 
 )
 
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "127.0.0.1"),  # 기본값: 127.0.0.1
-    port=int(os.getenv("REDIS_PORT", 6379)),   # 기본값: 6379
-    db=int(os.getenv("REDIS_DB", 0)),           # 기본 DB
-)
+# 워커 프로세스마다 하나 (redis: 비동기 연결 풀, local: 분석 루프와 공유하는 메모리 저장소)
+state_backend = get_state_backend()
 
-def has_significant_change(old_data: dict, new_data: dict) -> bool:
-    """
-    old_data와 new_data에서 player1/player2의 비교
-    - player1.hits.face, player2.hits.face
-    - player1.hits.body, player2.hits.body
-    - player1.punches.hook, player2.punches.hook
-    """
-    # 중첩 딕셔너리 접근 (없으면 default 반환)
-    def get_nested(d, keys, default=None):
-        for k in keys:
-            if not isinstance(d, dict) or k not in d:
-                return default
-            d = d[k]
-        return d
-
-    fields_to_check = [
-        ["player1", "hits", "face"],
-        ["player1", "hits", "body"],
-        ["player1", "punches", "hook"],
-        ["player2", "hits", "face"],
-        ["player2", "hits", "body"],
-        ["player2", "punches", "hook"],
-    ]
-
-    for field_keys in fields_to_check:
-        old_val = get_nested(old_data, field_keys)
-        new_val = get_nested(new_data, field_keys)
-        if old_val != new_val:
-            return True
-
-    return False
+rollup_store = None
+room_hub = RoomHub(state_backend)
+
+def get_rollup_store() -> RollupStore:
+    global rollup_store
+    if rollup_store is None:
+        rollup_store = RollupStore()
+    return rollup_store
 
 @app.get("/api/stream/{room_name}")
 async def stream_players(room_name: str):
+    """한 방의 상태 SSE (워커의 방 구독을 모든 클라이언트가 공유)"""
+    not_found = f"data: {json.dumps({'error': 'Room not found'})}\n\n"
+
     async def event_generator():
-        previous_data = {}
-        while True:
-            raw_data = redis_client.get(room_name)
-            
-            if raw_data:
-                try:
-                    current_data = json.loads(raw_data.decode("utf-8"))
+        subscription = room_hub.subscribe([room_name])
+        try:
+            await room_hub.ready.wait()
+            if room_name not in room_hub.states:
+                yield not_found
+            while True:
+                for message in await subscription.next_batch():
+                    if message.data['type'] == 'room':
+                        yield message.cached('sse_state', lambda: f"data: {json.dumps(message.data['state'])}\n\n")
+                    elif message.data['type'] == 'room_closed':
+                        yield not_found
+        finally:
+            room_hub.unsubscribe(subscription)
 
-                    if has_significant_change(previous_data, current_data):
-                        yield f"data: {json.dumps(current_data)}\n\n"
-                        previous_data = current_data 
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
 
-                except json.JSONDecodeError as e:
-                    yield f"data: {json.dumps({'error': 'Invalid data format in Redis'})}\n\n"
-            else:
-                yield f"data: {json.dumps({'error': 'Room not found'})}\n\n"
+@app.get("/api/rooms/{room_name}")
+async def room_snapshot(room_name: str, request: Request):
+    """
+    방 상태 스냅샷 (ETag = 상태 버전)
+    If-None-Match가 현재 버전과 같으면 본문 없이 304를 반환하므로 주기적으로 조회해도 비용이 작다.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        version = await state_backend.room_version(room_name)
+        if version is not None:
+            etag = f'"{version}"'
+            if etag in (tag.strip() for tag in if_none_match.split(",")):
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
-            await asyncio.sleep(0.4)
+    raw_data, version = await state_backend.room_snapshot(room_name)
+    if not raw_data:
+        raise HTTPException(status_code=404, detail="Room not found")
+    headers = {"Cache-Control": "no-cache"}
+    if version is not None:
+        headers["ETag"] = f'"{version}"'
+    return Response(content=raw_data, media_type="application/json", headers=headers)
+
+@app.get("/api/stream")
+async def stream_rooms(rooms: Optional[str] = None):
+    """
+    여러 방(또는 모든 활성 방)의 상태와 체육관 전체 집계를 하나의 SSE로 전달
+    - rooms: 쉼표로 구분한 방 이름 (없으면 모든 방)
+    """
+    room_names = [name for name in rooms.split(",") if name] if rooms else None
+
+    async def event_generator():
+        subscription = room_hub.subscribe(room_names)
+        try:
+            while True:
+                for message in await subscription.next_batch():
+                    yield f"data: {message.json()}\n\n"
+        finally:
+            room_hub.unsubscribe(subscription)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
+@app.websocket("/api/ws")
+async def stream_websocket(websocket: WebSocket):
+    """
+    MessagePack 바이너리 WebSocket 스트림
+    - 클라이언트는 {"rooms": [...], "fields": ["player1.hits", ...], "gym": true}를 보내 구독
+    - 구독 요청은 연결 중 언제든 다시 보낼 수 있음
+    """
+    await WebSocketClient(websocket, room_hub).run()
+
+@app.get("/api/scheduler")
+async def scheduler_budget():
+    """호스트 분석 예산과 방별 FPS 배분 현황"""
+    snapshot = await state_backend.scheduler()
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Scheduler state not found")
+    return snapshot
+
+@app.get("/api/rooms/{room_name}/pipeline")
+async def pipeline_stats(room_name: str):
+    """방 분석 파이프라인의 단계별 실행기, 큐 깊이, 처리량"""
+    stats = await state_backend.pipeline_stats(room_name)
+    if not stats:
+        raise HTTPException(status_code=404, detail="Pipeline stats not found")
+    return stats
+
+@app.post("/api/rooms/{room_name}/capture")
+async def start_capture(room_name: str):
+    """방 입력 캡처 시작 (분석 서버가 다음 폴링 때 반영)"""
+    await state_backend.set_capture(room_name, True)
+    return {'room': room_name, 'capture': True}
+
+@app.delete("/api/rooms/{room_name}/capture")
+async def stop_capture(room_name: str):
+    """방 입력 캡처 종료"""
+    await state_backend.set_capture(room_name, False)
+    return {'room': room_name, 'capture': False}
+
+@app.post("/api/rooms/{room_name}/round")
+async def start_round(room_name: str):
+    """다음 라운드 시작 (분석 서버가 다음 폴링 때 반영, 이후 이벤트는 새 라운드로 집계)"""
+    round_no = await state_backend.next_round(room_name)
+    if round_no is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return {'room': room_name, 'round': round_no}
+
+@app.get("/api/history/{room_name}/sessions")
+def history_sessions(room_name: str):
+    """방의 과거 세션 목록"""
+    return {'room': room_name, 'sessions': get_rollup_store().sessions(room_name)}
+
+@app.get("/api/history/{room_name}")
+def room_history(
+    room_name: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    session: Optional[int] = None,
+    resolution: Optional[str] = None,
+    max_points: int = 300,
+):
+    """
+    미리 집계된 선수별 시계열 반환 (punches, hits, hit_rate, punches_per_minute)
+    - start/end: unix time (기본값: 최근 1시간)
+    - session: 특정 세션만 조회 (없으면 전체 세션)
+    - resolution=round: 세션의 라운드별 집계
+    """
+    store = get_rollup_store()
+
+    if resolution == 'round':
+        if session is None:
+            sessions = store.sessions(room_name)
+            if not sessions:
+                raise HTTPException(status_code=404, detail="No history for room")
+            session = sessions[-1]['session']
+        return {'room': room_name, 'session': session, **store.query_rounds(room_name, session)}
+
+    if max_points < 1 or max_points > 5000:
+        raise HTTPException(status_code=400, detail="max_points must be between 1 and 5000")
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    result = store.query(room_name, start, end, max_points=max_points, session=session)
+    return {'room': room_name, 'start': start, 'end': end, 'session': session, **result}
+
 if __name__ == "__main__":
-    import uvicorn\
+    import uvicorn
     app_port = int(os.getenv("APP_PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=app_port)
\ No newline at end of file
+    # 워커마다 방 구독과 Redis 연결 풀을 따로 가지므로 워커 수만큼 처리량이 늘어남
+    workers = int(os.getenv("SERVER_WORKERS", 1))
+    if STATE_BACKEND == 'local' and workers > 1:
+        # 메모리 저장소는 프로세스 간에 공유되지 않음
+        print("STATE_BACKEND=local은 단일 워커로 실행합니다")
+        workers = 1
+    # WebSocket permessage-deflate는 uvicorn 기본값으로 켜져 있음
+    uvicorn.run("server:app", host="0.0.0.0", port=app_port, workers=workers)
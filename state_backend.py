@@ -0,0 +1,330 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional, Set, Tuple
+import redis
+import redis.asyncio as aioredis
+from utils import ACTIVE_ROOMS_KEY, SCHEDULER_KEY, CAPTURE_ROOMS_KEY, PIPELINE_STATS_KEY, ROUNDS_KEY, \
+    ROOM_CHANNEL_PREFIX, ROOM_EVENTS_CHANNEL, room_channel, room_version_key
+
+# redis: 분석 서버(main.py)와 SSE 서버(server.py)가 Redis로 상태 공유 (여러 워커/호스트)
+# local: 한 프로세스 안에서 메모리로 공유 (server.py가 분석 루프를 함께 실행, Redis 불필요)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "redis")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
+
+
+def redis_options() -> Dict:
+    return {
+        'host': os.getenv("REDIS_HOST", "127.0.0.1"),  # 기본값: 127.0.0.1
+        'port': int(os.getenv("REDIS_PORT", 6379)),    # 기본값: 6379
+        'db': int(os.getenv("REDIS_DB", 0)),            # 기본 DB
+    }
+
+
+class RedisListener:
+    """Redis pub/sub 기반 방 상태/이벤트 알림 구독"""
+
+    def __init__(self, client):
+        self.pubsub = client.pubsub()
+
+    async def start(self):
+        await self.pubsub.subscribe(ROOM_EVENTS_CHANNEL)
+
+    async def subscribe(self, room_names: Iterable[str]):
+        await self.pubsub.subscribe(*(room_channel(name) for name in room_names))
+
+    async def unsubscribe(self, room_names: Iterable[str]):
+        await self.pubsub.unsubscribe(*(room_channel(name) for name in room_names))
+
+    async def get_message(self, timeout: float) -> Optional[Dict]:
+        """{'type': 'state', 'room', 'data'} 또는 {'type': 'event', 'room', 'event'} (없으면 None)"""
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        channel = message['channel'].decode('utf-8')
+        if channel.startswith(ROOM_CHANNEL_PREFIX):
+            return {'type': 'state', 'room': channel[len(ROOM_CHANNEL_PREFIX):], 'data': message['data']}
+        if channel == ROOM_EVENTS_CHANNEL:
+            event = json.loads(message['data'])
+            return {'type': 'event', 'room': event['room'], 'event': event['event']}
+        return None
+
+    async def close(self):
+        await self.pubsub.reset()
+
+
+class RedisStateBackend:
+    """
+    Redis 상태 저장소
+    쓰기(분석 서버)는 동기 클라이언트, 읽기(SSE 서버)는 프로세스마다 하나인 비동기 연결 풀을 사용한다.
+    상태를 쓸 때마다 버전을 올리고 방별 채널로 알린다.
+    """
+
+    def __init__(self, max_connections=REDIS_MAX_CONNECTIONS):
+        self.client = redis.Redis(**redis_options())
+        # 연결이 모두 사용 중이면 반환될 때까지 대기
+        self.async_client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(
+            **redis_options(), max_connections=max_connections, timeout=5))
+
+    # 쓰기 (분석 서버)
+    def open_room(self, room_name: str):
+        # 분석 서버 재시작 후에도 스냅샷 ETag가 겹치지 않도록 버전은 현재 시각(ms)에서 시작
+        self.client.set(room_version_key(room_name), int(time.time() * 1000))
+        self.write_room_state(room_name, {})
+        self.client.hset(ROUNDS_KEY, room_name, 1)
+        self.client.sadd(ACTIVE_ROOMS_KEY, room_name)
+        self.client.publish(ROOM_EVENTS_CHANNEL, json.dumps({'room': room_name, 'event': 'opened'}))
+
+    def write_room_state(self, room_name: str, state: Dict):
+        payload = json.dumps(state)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(room_name, payload)
+        pipe.incr(room_version_key(room_name))
+        pipe.publish(room_channel(room_name), payload)
+        pipe.execute()
+
+    def close_room(self, room_name: str):
+        self.client.delete(room_name, room_version_key(room_name))
+        self.client.srem(ACTIVE_ROOMS_KEY, room_name)
+        self.client.hdel(PIPELINE_STATS_KEY, room_name)
+        self.client.hdel(ROUNDS_KEY, room_name)
+        self.client.publish(ROOM_EVENTS_CHANNEL, json.dumps({'room': room_name, 'event': 'closed'}))
+
+    def set_scheduler(self, snapshot: Dict):
+        self.client.set(SCHEDULER_KEY, json.dumps(snapshot))
+
+    def set_pipeline_stats(self, stats: Dict[str, Dict]):
+        if stats:
+            self.client.hset(PIPELINE_STATS_KEY, mapping={
+                room_name: json.dumps(room_stats) for room_name, room_stats in stats.items()
+            })
+
+    def capture_rooms(self) -> Set[str]:
+        return {name.decode("utf-8") for name in self.client.smembers(CAPTURE_ROOMS_KEY)}
+
+    def room_rounds(self) -> Dict[str, int]:
+        return {name.decode("utf-8"): int(value) for name, value in self.client.hgetall(ROUNDS_KEY).items()}
+
+    def clear(self):
+        self.client.flushdb()
+
+    # 읽기 (SSE 서버)
+    async def room_states(self) -> Dict[str, Optional[bytes]]:
+        """활성 방 전체 상태 (방 이름 -> JSON bytes)"""
+        room_names = sorted(name.decode('utf-8') for name in await self.async_client.smembers(ACTIVE_ROOMS_KEY))
+        values = await self.async_client.mget(room_names) if room_names else []
+        return dict(zip(room_names, values))
+
+    async def room_state(self, room_name: str) -> Optional[bytes]:
+        return await self.async_client.get(room_name)
+
+    async def room_version(self, room_name: str) -> Optional[str]:
+        version = await self.async_client.get(room_version_key(room_name))
+        return version.decode('utf-8') if version is not None else None
+
+    async def room_snapshot(self, room_name: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """(상태 JSON bytes, 버전)을 한 번에 읽음"""
+        raw_data, version = await self.async_client.mget([room_name, room_version_key(room_name)])
+        return raw_data, version.decode('utf-8') if version is not None else None
+
+    async def scheduler(self) -> Optional[Dict]:
+        raw_data = await self.async_client.get(SCHEDULER_KEY)
+        return json.loads(raw_data.decode("utf-8")) if raw_data else None
+
+    async def pipeline_stats(self, room_name: str) -> Optional[Dict]:
+        raw_data = await self.async_client.hget(PIPELINE_STATS_KEY, room_name)
+        return json.loads(raw_data.decode("utf-8")) if raw_data else None
+
+    async def set_capture(self, room_name: str, enabled: bool):
+        if enabled:
+            await self.async_client.sadd(CAPTURE_ROOMS_KEY, room_name)
+        else:
+            await self.async_client.srem(CAPTURE_ROOMS_KEY, room_name)
+
+    async def next_round(self, room_name: str) -> Optional[int]:
+        """다음 라운드 시작 (활성 방이 아니면 None)"""
+        if not await self.async_client.sismember(ACTIVE_ROOMS_KEY, room_name):
+            return None
+        return await self.async_client.hincrby(ROUNDS_KEY, room_name, 1)
+
+    def listener(self) -> RedisListener:
+        return RedisListener(self.async_client)
+
+
+class LocalListener:
+    """
+    프로세스 내 알림 구독
+    방별로 가장 최근 상태만 보관하므로 읽는 쪽이 밀려도 큐가 쌓이지 않는다.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.rooms = set()
+        self.events = deque()
+        self.states = {}
+        self.ready = asyncio.Event()
+
+    async def start(self):
+        self.backend.listeners.add(self)
+
+    async def subscribe(self, room_names: Iterable[str]):
+        self.rooms |= set(room_names)
+
+    async def unsubscribe(self, room_names: Iterable[str]):
+        for room_name in room_names:
+            self.rooms.discard(room_name)
+            self.states.pop(room_name, None)
+
+    def push_state(self, room_name: str, state: Dict):
+        if room_name in self.rooms:
+            self.states[room_name] = state
+            self.ready.set()
+
+    def push_event(self, room_name: str, event: str):
+        self.events.append((room_name, event))
+        self.ready.set()
+
+    async def get_message(self, timeout: float) -> Optional[Dict]:
+        if not self.events and not self.states:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.events:
+            room_name, event = self.events.popleft()
+            return {'type': 'event', 'room': room_name, 'event': event}
+        if self.states:
+            room_name = next(iter(self.states))
+            return {'type': 'state', 'room': room_name, 'data': self.states.pop(room_name)}
+        return None
+
+    async def close(self):
+        self.backend.listeners.discard(self)
+
+
+class LocalStateBackend:
+    """
+    한 프로세스 안에서 공유하는 메모리 상태 저장소 (소규모 체육관, 테스트, 벤치마크용)
+    상태는 JSON 대신 dict 그대로 전달하고, 스냅샷 API가 요청할 때만 버전별로 한 번 직렬화한다.
+    write_room_state에 넘긴 dict는 이후 변경하지 않아야 한다 (PunchDetector.state_snapshot처럼 프레임마다 새로 생성).
+    분석 루프와 SSE 서버가 같은 이벤트 루프에서 실행된다고 가정한다.
+    """
+
+    def __init__(self):
+        self.states = {}        # room -> 상태 (쓰는 쪽이 새로 만든 dict)
+        self.versions = {}
+        self.active = set()
+        self.scheduler_snapshot = None
+        self.stats = {}
+        self.captures = set()
+        self.rounds = {}
+        self.listeners = set()
+        self.encoded = {}       # room -> (버전, JSON bytes)
+
+    # 쓰기 (분석 루프)
+    def open_room(self, room_name: str):
+        self.versions[room_name] = int(time.time() * 1000)
+        self.write_room_state(room_name, {})
+        self.rounds[room_name] = 1
+        self.active.add(room_name)
+        for listener in self.listeners:
+            listener.push_event(room_name, 'opened')
+
+    def write_room_state(self, room_name: str, state: Dict):
+        self.states[room_name] = state
+        self.versions[room_name] = self.versions.get(room_name, 0) + 1
+        for listener in self.listeners:
+            listener.push_state(room_name, state)
+
+    def close_room(self, room_name: str):
+        self.states.pop(room_name, None)
+        self.versions.pop(room_name, None)
+        self.encoded.pop(room_name, None)
+        self.stats.pop(room_name, None)
+        self.rounds.pop(room_name, None)
+        self.active.discard(room_name)
+        for listener in self.listeners:
+            listener.push_event(room_name, 'closed')
+
+    def set_scheduler(self, snapshot: Dict):
+        self.scheduler_snapshot = snapshot
+
+    def set_pipeline_stats(self, stats: Dict[str, Dict]):
+        self.stats.update(stats)
+
+    def capture_rooms(self) -> Set[str]:
+        return set(self.captures)
+
+    def room_rounds(self) -> Dict[str, int]:
+        return dict(self.rounds)
+
+    def clear(self):
+        self.states.clear()
+        self.versions.clear()
+        self.encoded.clear()
+        self.active.clear()
+        self.stats.clear()
+        self.captures.clear()
+        self.rounds.clear()
+        self.scheduler_snapshot = None
+
+    # 읽기 (SSE 서버)
+    async def room_states(self) -> Dict[str, Optional[Dict]]:
+        return {room_name: self.states.get(room_name) for room_name in sorted(self.active)}
+
+    async def room_state(self, room_name: str) -> Optional[Dict]:
+        return self.states.get(room_name)
+
+    async def room_version(self, room_name: str) -> Optional[str]:
+        version = self.versions.get(room_name)
+        return str(version) if version is not None else None
+
+    async def room_snapshot(self, room_name: str) -> Tuple[Optional[bytes], Optional[str]]:
+        state = self.states.get(room_name)
+        if state is None:
+            return None, None
+        version = self.versions[room_name]
+        cached = self.encoded.get(room_name)
+        if cached is None or cached[0] != version:
+            cached = self.encoded[room_name] = (version, json.dumps(state).encode('utf-8'))
+        return cached[1], str(version)
+
+    async def scheduler(self) -> Optional[Dict]:
+        return self.scheduler_snapshot
+
+    async def pipeline_stats(self, room_name: str) -> Optional[Dict]:
+        return self.stats.get(room_name)
+
+    async def set_capture(self, room_name: str, enabled: bool):
+        if enabled:
+            self.captures.add(room_name)
+        else:
+            self.captures.discard(room_name)
+
+    async def next_round(self, room_name: str) -> Optional[int]:
+        if room_name not in self.active:
+            return None
+        self.rounds[room_name] += 1
+        return self.rounds[room_name]
+
+    def listener(self) -> LocalListener:
+        return LocalListener(self)
+
+
+_backend = None
+
+
+def get_state_backend():
+    """프로세스 전체에서 공유하는 상태 저장소 (STATE_BACKEND로 선택)"""
+    global _backend
+    if _backend is None:
+        if STATE_BACKEND == 'redis':
+            _backend = RedisStateBackend()
+        elif STATE_BACKEND == 'local':
+            _backend = LocalStateBackend()
+        else:
+            raise ValueError(f"STATE_BACKEND는 redis 또는 local이어야 합니다: {STATE_BACKEND}")
+    return _backend
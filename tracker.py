@@ -1,6 +1,7 @@
-from collections import deque
+import time
 import numpy as np
 from typing import Dict, List, Optional
+from history_buffer import PlayerHistory
 
 class PlayerTracker:
     def __init__(self, max_history=30):
@@ -8,13 +9,13 @@ class PlayerTracker:
         self.players = {
             'player1': {
                 'position': 'left',
-                'history': deque(maxlen=max_history),
+                'history': PlayerHistory(max_history),
                 'movement_score': 0,
                 'last_position': None
             },
             'player2': {
                 'position': 'right',
-                'history': deque(maxlen=max_history),
+                'history': PlayerHistory(max_history),
                 'movement_score': 0,
                 'last_position': None
             }
@@ -27,16 +28,12 @@ class PlayerTracker:
         
         # 이동 점수 계산
         if player['last_position']:
-            movement = np.linalg.norm(np.array(current_center) - np.array(player['last_position']))
-            player['movement_score'] = movement
+            dx = current_center[0] - player['last_position'][0]
+            dy = current_center[1] - player['last_position'][1]
+            player['movement_score'] = float(np.hypot(dx, dy))
         
         player['last_position'] = current_center
-        player['history'].append({
-            'bbox': bbox,
-            'landmarks': landmarks,
-            'confidence': confidence,
-            'center': current_center
-        })
+        player['history'].append(bbox, current_center, confidence, landmarks, time.time())
     
     def get_player_stats(self, player_id: str) -> Dict:
         """선수의 상세 통계 정보 반환"""
@@ -44,14 +41,8 @@ class PlayerTracker:
         if not player['history']:
             return {}
         
-        recent_positions = [frame['center'] for frame in player['history']]
-        movement_range = {
-            'x': (min(p[0] for p in recent_positions), max(p[0] for p in recent_positions)),
-            'y': (min(p[1] for p in recent_positions), max(p[1] for p in recent_positions))
-        }
-        
         return {
             'movement_score': player['movement_score'],
-            'movement_range': movement_range,
-            'avg_confidence': np.mean([frame['confidence'] for frame in player['history']])
-        } 
\ No newline at end of file
+            'movement_range': player['history'].movement_range(),
+            'avg_confidence': player['history'].avg_confidence()
+        }
@@ -1,6 +1,62 @@
 import json
+import os
+import cv2
+import numpy as np
 
 def save_results(results, filename):
     """분석 결과를 JSON 파일로 저장"""
     with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=4) 
\ No newline at end of file
+        json.dump(results, f, ensure_ascii=False, indent=4) 
+
+def i420_to_bgr(data, width, height):
+    """I420(YUV) 프레임 버퍼를 BGR 이미지로 변환"""
+    yuv_image = np.frombuffer(data, dtype=np.uint8).reshape((height + height // 2, width))
+    return cv2.cvtColor(yuv_image, cv2.COLOR_YUV2BGR_I420)
+
+def preprocess_frame(frame):
+    """분석 전 밝기/대비 보정과 블러 적용"""
+    # 데이터 타입 변환 (float64 → uint8)
+    if frame.dtype != np.uint8:
+        frame = (frame * 255).astype(np.uint8)
+
+    # NumPy로 밝기와 대비 조정
+    frame = frame * 1.2 + 10
+    frame = np.clip(frame, 0, 255).astype(np.uint8) 
+
+    # OpenCV로 블러 적용
+    return cv2.blur(frame, (3, 3))
+
+# 분석 루프(main.py)에 필요한 LiveKit 설정
+LIVEKIT_ENV_VARS = ("LIVEKIT_URL", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET")
+
+def missing_livekit_config():
+    """설정되지 않은 LiveKit 환경 변수 이름 목록"""
+    return [name for name in LIVEKIT_ENV_VARS if not os.getenv(name)]
+
+# 현재 분석 중인 방 이름 집합 (Redis set)
+ACTIVE_ROOMS_KEY = "active_rooms"
+
+# 호스트 분석 예산 배분 현황 (JSON)
+SCHEDULER_KEY = "scheduler"
+
+# 입력 캡처 중인 방 이름 집합 (Redis set)
+CAPTURE_ROOMS_KEY = "capture_rooms"
+
+# 방별 분석 파이프라인 단계 통계 (Redis hash: 방 이름 -> JSON)
+PIPELINE_STATS_KEY = "pipeline_stats"
+
+# 방별 현재 라운드 번호 (Redis hash: 방 이름 -> 라운드, POST /api/rooms/{room}/round로 증가)
+ROUNDS_KEY = "rounds"
+
+# 방 상태 버전 (상태를 쓸 때마다 INCR, 스냅샷 ETag로 사용)
+def room_version_key(room_name: str) -> str:
+    return f"{room_name}:version"
+
+# 방 상태 변경 알림 채널 (payload: Redis에 쓴 상태 JSON과 동일)
+ROOM_CHANNEL_PREFIX = "room_state:"
+
+def room_channel(room_name: str) -> str:
+    return f"{ROOM_CHANNEL_PREFIX}{room_name}"
+
+# 방 시작/종료 알림 채널 (payload: {"room": ..., "event": "opened" | "closed"})
+ROOM_EVENTS_CHANNEL = "room_events"
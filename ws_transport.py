@@ -0,0 +1,167 @@
+import asyncio
+import json
+import msgpack
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import WebSocket, WebSocketDisconnect
+
+# 느린 클라이언트 연결 종료 기준 (초)
+SEND_TIMEOUT = 5.0
+
+
+def flatten(data, prefix='', out=None) -> Dict:
+    """중첩 딕셔너리를 'player1.hits.face' 형태의 평탄한 딕셔너리로 변환"""
+    if out is None:
+        out = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flatten(value, path + '.', out)
+        else:
+            out[path] = value
+    return out
+
+
+def project(flat: Dict, fields: Optional[Iterable[str]]) -> Dict:
+    """구독한 필드(또는 그 하위 경로)만 남김"""
+    if not fields:
+        return flat
+    return {
+        path: value for path, value in flat.items()
+        if any(path == field or path.startswith(field + '.') for field in fields)
+    }
+
+
+def diff(old: Dict, new: Dict) -> Tuple[Dict, List[str]]:
+    """
+    바뀐 값과 삭제된 경로 목록 계산
+    값이 None으로 바뀐 경로(tracking_id 등)와 삭제된 경로를 구분하기 위해 삭제는 따로 반환한다.
+    """
+    changes = {path: value for path, value in new.items() if old.get(path, ...) != value}
+    removed = sorted(old.keys() - new.keys())
+    return changes, removed
+
+
+def pack(data: dict) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def flat_state(message) -> Dict:
+    """메시지의 평탄화 결과는 모든 클라이언트가 공유"""
+    return message.cached('flat', lambda: flatten(message.data['state']))
+
+
+def encode_room(message, fields_key, previous=None) -> Optional[bytes]:
+    """
+    방 상태 프레임 인코딩
+    같은 필드 구독과 같은 이전 메시지를 가진 클라이언트는 결과 바이트를 공유한다.
+    """
+    room_name = message.data['room']
+    state = message.cached(('project', fields_key), lambda: project(flat_state(message), fields_key))
+    if previous is None:
+        return message.cached(('room', fields_key), lambda: pack({'t': 'room', 'r': room_name, 's': state}))
+
+    def encode_delta():
+        changes, removed = diff(previous.cached(('project', fields_key),
+                                                lambda: project(flat_state(previous), fields_key)), state)
+        if not changes and not removed:
+            return None
+        delta = {'t': 'delta', 'r': room_name, 'd': changes}
+        if removed:
+            delta['x'] = removed
+        return pack(delta)
+
+    # 이전 메시지는 버전으로 구분 (객체 id는 GC 후 재사용될 수 있음)
+    return message.cached(('delta', fields_key, previous.version), encode_delta)
+
+
+class WebSocketClient:
+    """
+    MessagePack 바이너리 프레임으로 구독한 방의 상태/변경분을 전송
+    - 첫 메시지: {'t': 'room', 'r': 방, 's': 필드 상태}
+    - 이후: {'t': 'delta', 'r': 방, 'd': {경로: 값}, 'x': [삭제된 경로]} ('x'는 삭제가 있을 때만)
+    - {'t': 'closed', 'r': 방}, {'t': 'gym', ...체육관 집계}
+    """
+
+    def __init__(self, websocket: WebSocket, hub):
+        self.websocket = websocket
+        self.hub = hub
+        self.subscription = None
+        self.fields = None
+        self.sent = {}   # room -> 클라이언트에 마지막으로 보낸 메시지
+        self.gym = True
+
+    def subscribe(self, request: Dict):
+        """{'rooms': [...], 'fields': [...], 'gym': bool} 구독 요청 처리"""
+        previous = self.subscription
+        if previous:
+            self.hub.unsubscribe(previous)
+        fields = request.get('fields')
+        self.fields = tuple(sorted(fields)) if fields else None
+        self.gym = request.get('gym', True)
+        self.sent = {}
+        self.subscription = self.hub.subscribe(request.get('rooms'))
+        if previous:
+            # 이전 구독의 next_batch에서 대기 중인 송신 루프를 깨워 새 구독으로 넘어가게 함
+            previous.ready.set()
+
+    def encode(self, message) -> Optional[bytes]:
+        data = message.data
+        if data['type'] == 'gym':
+            if not self.gym:
+                return None
+            # 체육관 집계는 모든 클라이언트에 같은 바이트를 전송
+            gym = {key: value for key, value in data.items() if key != 'type'}
+            return message.cached('msgpack', lambda: pack({'t': 'gym', **gym}))
+
+        room_name = data['room']
+        if data['type'] == 'room_closed':
+            self.sent.pop(room_name, None)
+            return pack({'t': 'closed', 'r': room_name})
+
+        frame = encode_room(message, self.fields, self.sent.get(room_name))
+        self.sent[room_name] = message
+        return frame
+
+    async def receive_requests(self):
+        while True:
+            message = await self.websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
+            if message.get('bytes') is not None:
+                request = msgpack.unpackb(message['bytes'], raw=False)
+            else:
+                request = json.loads(message.get('text') or '{}')
+            self.subscribe(request)
+
+    async def send_updates(self):
+        while True:
+            if self.subscription is None:
+                await asyncio.sleep(0.05)
+                continue
+            subscription = self.subscription
+            for message in await subscription.next_batch():
+                if subscription is not self.subscription:
+                    break  # 재구독했으면 이전 구독 메시지는 버리고 새 구독에서 대기
+                frame = self.encode(message)
+                if frame is None:
+                    continue
+                # 전송이 밀리는 동안 새 상태는 구독 버퍼에서 방별 최신값으로 합쳐짐
+                await asyncio.wait_for(self.websocket.send_bytes(frame), SEND_TIMEOUT)
+
+    async def run(self):
+        await self.websocket.accept()
+        tasks = [asyncio.create_task(self.receive_requests()), asyncio.create_task(self.send_updates())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exc = task.exception()
+                if isinstance(exc, asyncio.TimeoutError):
+                    print("Closing slow websocket client")
+                    await self.websocket.close(code=1013)
+                elif exc and not isinstance(exc, WebSocketDisconnect):
+                    print(f"Error in websocket client: {exc}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.subscription:
+                self.hub.unsubscribe(self.subscription)